@@ -0,0 +1,153 @@
+"""HTTP-кэширование справочников и общий кэш ответов для анонимов"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import CatalogVersion
+
+CATALOG_VERSION_ID = 1
+
+
+def get_catalog_version():
+    """
+    Версия каталога - время последнего изменения в миллисекундах.
+    Хранится в БД, чтобы все воркеры отдавали один ETag и видели изменения
+    друг друга; это один запрос по первичному ключу вместо сериализации.
+    """
+    version = (
+        CatalogVersion.objects.filter(id=CATALOG_VERSION_ID)
+        .values_list("version", flat=True)
+        .first()
+    )
+    if version is None:
+        version = CatalogVersion.objects.get_or_create(
+            id=CATALOG_VERSION_ID, defaults={"version": int(time.time() * 1000)}
+        )[0].version
+    return version
+
+
+def bump_catalog_version():
+    """Новая версия видна другим процессам после коммита изменения каталога"""
+    version = int(time.time() * 1000)
+    updated = CatalogVersion.objects.filter(id=CATALOG_VERSION_ID).update(
+        version=Greatest(F("version") + 1, Value(version))
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(
+            id=CATALOG_VERSION_ID, defaults={"version": version}
+        )
+
+
+class CatalogCacheMixin:
+    """
+    Отдаёт ETag/Last-Modified по версии каталога и отвечает 304
+    на условный GET до аутентификации и сериализации. Ответ 304 стоит
+    одного запроса к БД: чтения версии из CatalogVersion по первичному ключу.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        etag = '"{}"'.format(
+            hashlib.md5(
+                "{}:{}".format(version, request.get_full_path()).encode()
+            ).hexdigest()
+        )
+        last_modified = version // 1000
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+        )
+        return response
+
+
+def get_recipe_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def new_scope_version():
+    """
+    Начальное поколение - время в наносекундах, а не 1: после вытеснения
+    счётчика из кэша старые ответы с поколением 1 не должны ожить.
+    """
+    return time.time_ns()
+
+
+def get_scope_versions(scopes):
+    """Поколения областей кэша; смена поколения делает старые ключи недостижимыми"""
+    recipe_cache = get_recipe_cache()
+    keys = ["recipe_scope:{}".format(scope) for scope in scopes]
+    versions = recipe_cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_scope_version()
+            recipe_cache.add(key, version, timeout=None)
+            versions[key] = recipe_cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def invalidate_recipe_scopes(recipe_id, author_id, tag_slugs):
+    """Вытесняет из кэша рецепт и только те списки, в которые он мог попасть"""
+    scopes = ["recipes", "recipe:{}".format(recipe_id), "author:{}".format(author_id)]
+    scopes += ["tag:{}".format(slug) for slug in tag_slugs]
+    invalidate_scopes(scopes)
+
+
+def invalidate_scopes(scopes):
+    recipe_cache = get_recipe_cache()
+    for scope in scopes:
+        key = "recipe_scope:{}".format(scope)
+        try:
+            recipe_cache.incr(key)
+        except ValueError:
+            recipe_cache.set(key, new_scope_version(), timeout=None)
+
+
+def get_list_scopes(request):
+    scopes = ["tag:{}".format(slug) for slug in request.query_params.getlist("tags")]
+    author = request.query_params.get("author")
+    if author:
+        scopes.append("author:{}".format(author))
+    return scopes or ["recipes"]
+
+
+def get_cache_key(request, scopes):
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    raw = "{}|{}|{}|{}".format(
+        request.get_host(), request.path, params, get_scope_versions(scopes)
+    )
+    return "recipe_response:{}".format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def cached_anonymous_response(request, scopes, get_response):
+    """Общий кэш ответов для анонимных GET-запросов"""
+    if not request.user.is_anonymous:
+        return get_response()
+    recipe_cache = get_recipe_cache()
+    key = get_cache_key(request, scopes)
+    data = recipe_cache.get(key)
+    if data is not None:
+        return Response(data)
+    response = get_response()
+    if response.status_code == 200:
+        recipe_cache.set(key, response.data, timeout=settings.RECIPE_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,118 @@
+"""Параллельные запросы к БД и асинхронные читающие эндпоинты для ASGI"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import prefetch_related_objects
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_fanout_executor = None
+_read_executor = None
+
+
+def get_fanout_executor():
+    global _fanout_executor
+    if _fanout_executor is None:
+        _fanout_executor = ThreadPoolExecutor(
+            max_workers=settings.DB_FANOUT_WORKERS, thread_name_prefix="db-fanout"
+        )
+    return _fanout_executor
+
+
+def get_read_executor():
+    global _read_executor
+    if _read_executor is None:
+        _read_executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_READ_THREADS, thread_name_prefix="async-read"
+        )
+    return _read_executor
+
+
+def call_and_release_connection(function, *args, **kwargs):
+    """У каждого потока пула своё соединение, его закрывает CONN_MAX_AGE"""
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(*functions):
+    """
+    Выполняет независимые запросы в отдельных потоках и возвращает
+    их результаты по порядку. Внутри транзакции другие соединения
+    не видят её изменений, поэтому там запросы идут последовательно.
+    """
+    if (
+        not settings.DB_FANOUT_WORKERS
+        or len(functions) < 2
+        or connection.in_atomic_block
+    ):
+        return [function() for function in functions]
+    executor = get_fanout_executor()
+    futures = [
+        executor.submit(call_and_release_connection, function) for function in functions
+    ]
+    return [future.result() for future in futures]
+
+
+def prefetch_concurrently(instances, lookups):
+    """prefetch_related_objects, где каждый lookup - отдельный параллельный запрос"""
+    instances = list(instances)
+    if not instances:
+        return
+    for instance in instances:
+        # Общий словарь заранее, иначе потоки перезапишут кэши друг друга
+        if not hasattr(instance, "_prefetched_objects_cache"):
+            instance._prefetched_objects_cache = {}
+    run_concurrently(
+        *(partial(prefetch_related_objects, instances, lookup) for lookup in lookups)
+    )
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, "render", None)):
+        response.render()
+    return response
+
+
+class AsyncReadViewSetMixin:
+    """
+    Под ASGI Django выполняет синхронные представления по одному в общем
+    потоке. С ASYNC_READ_VIEWS маршруты, чей GET ведёт на действие
+    из async_read_actions, становятся асинхронными: чтение идёт в пуле
+    из ASYNC_READ_THREADS потоков, запись - как раньше, в общем потоке.
+    """
+
+    async_read_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        read_action = actions.get("get")
+        if not settings.ASYNC_READ_VIEWS or read_action not in cls.async_read_actions:
+            return view
+
+        async def async_view(request, *args, **kwargs):
+            if request.method not in READ_METHODS:
+                return await sync_to_async(view)(request, *args, **kwargs)
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                get_read_executor(),
+                partial(
+                    context.run,
+                    call_and_release_connection,
+                    render_view,
+                    view,
+                    request,
+                    *args,
+                    **kwargs,
+                ),
+            )
+
+        return update_wrapper(async_view, view)
@@ -0,0 +1,53 @@
+"""Денормализованные счётчики рецептов, избранного и списков покупок"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+class CounterFieldsMixin:
+    """
+    Полный save() существующей строки не пишет counter_fields: их меняют
+    только change_counter и пересчёт, иначе устаревший экземпляр (например,
+    request.user из кэша токенов) затрёт чужие инкременты.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not self._state.adding
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно меняет счётчик в БД, не опускаясь ниже нуля"""
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def recount_counters(user_model, recipe_model, favorite_model, cart_model):
+    """Пересчитывает все счётчики по исходным таблицам"""
+    recipe_model.objects.update(
+        favorites_count=count_subquery(favorite_model, "recipe"),
+        carts_count=count_subquery(cart_model, "recipe"),
+    )
+    user_model.objects.update(recipes_count=count_subquery(recipe_model, "author"))
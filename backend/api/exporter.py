@@ -0,0 +1,172 @@
+"""Потоковая выгрузка данных в формате, который читает api.importer"""
+import csv
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from users.models import Subscribers
+
+from .importer import IMPORTERS, batched
+from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag, TagRecipe
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+
+
+class FlatExport:
+    """Строки модели как плоские словари {поле выгрузки: значение lookup}"""
+
+    formats = ("csv", "jsonl")
+
+    def __init__(self, model, lookups):
+        self.model = model
+        self.lookups = lookups
+
+    @property
+    def fields(self):
+        return tuple(self.lookups)
+
+    def rows(self, chunk_size):
+        queryset = self.model.objects.order_by("pk").values_list(*self.lookups.values())
+        for values in queryset.iterator(chunk_size=chunk_size):
+            yield dict(zip(self.fields, values))
+
+
+class RecipeExport:
+    """
+    Рецепты с тегами и ингредиентами. Связи догружаются двумя запросами
+    на пачку рецептов, prefetch_related с iterator() не работает.
+    Рецепт определяется uuid: пара автор и название не уникальна.
+    """
+
+    formats = ("jsonl",)
+    fields = (
+        "uuid",
+        "author",
+        "name",
+        "text",
+        "cooking_time",
+        "image",
+        "thumbnail",
+        "placeholder",
+    )
+
+    def rows(self, chunk_size):
+        recipes = Recipe.objects.order_by("pk").values_list(
+            "id",
+            "uuid",
+            "author__email",
+            "name",
+            "text",
+            "cooking_time",
+            "image",
+            "thumbnail",
+            "placeholder",
+        )
+        for chunk in batched(recipes.iterator(chunk_size=chunk_size), chunk_size):
+            recipe_ids = [values[0] for values in chunk]
+            tags = defaultdict(list)
+            for recipe_id, slug in TagRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list("recipe_id", "tag__slug"):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, measurement_unit, amount in (
+                RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+                .order_by("pk")
+                .values_list(
+                    "recipe_id",
+                    "ingredient__name",
+                    "ingredient__measurement_unit",
+                    "amount",
+                )
+            ):
+                ingredients[recipe_id].append(
+                    {
+                        "name": name,
+                        "measurement_unit": measurement_unit,
+                        "amount": amount,
+                    }
+                )
+            for recipe_id, *values in chunk:
+                row = dict(zip(self.fields, values))
+                row["tags"] = tags[recipe_id]
+                row["ingredients"] = ingredients[recipe_id]
+                yield row
+
+
+def get_model_lookups(kind):
+    importer = IMPORTERS[kind]
+    return {field: field for field in importer.key_fields + importer.update_fields}
+
+
+RECIPE_LINK_LOOKUPS = {
+    "user": "user__email",
+    "recipe": "recipe__uuid",
+}
+
+# В этом порядке выгрузку нужно загружать обратно через import_data
+EXPORTS = {
+    "users": FlatExport(User, get_model_lookups("users")),
+    "tags": FlatExport(Tag, get_model_lookups("tags")),
+    "ingredients": FlatExport(Ingredient, get_model_lookups("ingredients")),
+    "recipes": RecipeExport(),
+    "subscriptions": FlatExport(
+        Subscribers, {"user": "user__email", "author": "subscribed__email"}
+    ),
+    "favorites": FlatExport(Favorite, RECIPE_LINK_LOOKUPS),
+    "carts": FlatExport(Cart, RECIPE_LINK_LOOKUPS),
+}
+
+
+def write_jsonl(rows, file, fields):
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False, default=str))
+        file.write("\n")
+        yield row
+
+
+def write_csv(rows, file, fields):
+    writer = csv.DictWriter(file, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield row
+
+
+WRITERS = {
+    "jsonl": write_jsonl,
+    "csv": write_csv,
+}
+
+
+@contextmanager
+def snapshot():
+    """
+    Одна транзакция на всю выгрузку: файлы согласованы между собой,
+    связи не ссылаются на рецепты, созданные после выгрузки рецептов.
+    """
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+                )
+        yield
+
+
+def export_file(kind, path, file_format="jsonl", chunk_size=CHUNK_SIZE):
+    """Пишет выгрузку в файл, возвращает число строк и время в секундах"""
+    export = EXPORTS[kind]
+    if file_format not in export.formats:
+        raise ValueError("Формат {} не поддерживается для {}".format(file_format, kind))
+    started = time.monotonic()
+    with open(path, "wt", encoding="utf8", newline="") as file:
+        rows = WRITERS[file_format](export.rows(chunk_size), file, export.fields)
+        count = sum(1 for _ in rows)
+    return count, time.monotonic() - started
@@ -0,0 +1,103 @@
+"""Лента подписок, материализованная при записи"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from users.models import Subscribers
+
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE = 1000
+
+
+def trim_feed(user_id):
+    """
+    Обрезает ленту одного пользователя до FEED_MAX_LENGTH: читается не больше
+    FEED_MAX_LENGTH + 1 строк индекса, удаляются только лишние.
+    """
+    limit = settings.FEED_MAX_LENGTH
+    cutoff_end = limit + 1
+    cutoff = (
+        FeedEntry.objects.filter(user_id=user_id)
+        .order_by("-recipe_id")
+        .values_list("recipe_id", flat=True)[limit:cutoff_end]
+        .first()
+    )
+    if cutoff is not None:
+        FeedEntry.objects.filter(user_id=user_id, recipe_id__lte=cutoff).delete()
+
+
+def trim_feeds(user_ids):
+    """
+    Пакетная обрезка лент для периодической команды trim_feeds; в запросах
+    на запись не вызывается. Возвращает число удалённых записей.
+    """
+    sql, params = (
+        FeedEntry.objects.filter(user_id__in=user_ids)
+        .annotate(
+            feed_rank=Window(
+                expression=RowNumber(),
+                partition_by=F("user_id"),
+                order_by=F("recipe_id").desc(),
+            )
+        )
+        .values("id", "feed_rank")
+        .query.sql_with_params()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {table} WHERE id IN "
+            "(SELECT id FROM ({sql}) ranked WHERE feed_rank > %s)".format(
+                table=FeedEntry._meta.db_table, sql=sql
+            ),
+            params + (settings.FEED_MAX_LENGTH,),
+        )
+        return cursor.rowcount
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты всех подписчиков автора"""
+    fan_out_recipes(((recipe.id, recipe.author_id),))
+
+
+def fan_out_recipes(recipes):
+    """
+    Пакетный fan_out_recipe для пар (id рецепта, id автора). Ленты здесь не
+    обрезаются: лишние записи удаляет команда trim_feeds.
+    """
+    recipe_ids_by_author = defaultdict(list)
+    for recipe_id, author_id in recipes:
+        recipe_ids_by_author[author_id].append(recipe_id)
+    followers = Subscribers.objects.filter(
+        subscribed_id__in=recipe_ids_by_author
+    ).values_list("user_id", "subscribed_id")
+    entries = []
+    for user_id, author_id in followers.iterator():
+        entries += (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in recipe_ids_by_author[author_id]
+        )
+    FeedEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def backfill_feed(user, author):
+    """Заполняет ленту последними рецептами автора после подписки"""
+    recipe_ids = Recipe.objects.filter(author=author).order_by("-id")
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user=user, recipe_id=recipe_id)
+            for recipe_id in recipe_ids.values_list("id", flat=True)[
+                : settings.FEED_MAX_LENGTH
+            ]
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_feed(user.id)
+
+
+def remove_author_from_feed(user, author):
+    FeedEntry.objects.filter(user=user, recipe__author=author).delete()
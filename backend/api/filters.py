@@ -1,5 +1,104 @@
-from rest_framework.filters import SearchFilter
+from django import forms
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .ingredient_index import ingredient_index
+from .models import Recipe, TagRecipe
+from .search import search_recipes
 
 
 class IngredientSearchFilter(SearchFilter):
+    """
+    Поиск по началу названия через индекс в памяти, без запроса к БД.
+    Индекс отдаёт список, поэтому применяется только к списку: карточке
+    ингредиента нужен queryset.
+    """
+
     search_param = "name"
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or getattr(view, "action", None) != "list":
+            return queryset
+        return ingredient_index.search(
+            search_terms, limit=settings.INGREDIENT_SEARCH_LIMIT
+        )
+
+
+class MultipleCharField(forms.MultipleChoiceField):
+    """Список строк из повторяющегося параметра, без проверки по choices"""
+
+    def valid_value(self, value):
+        return True
+
+
+class MultipleCharFilter(filters.Filter):
+    field_class = MultipleCharField
+
+
+class RecipeFilter(filters.FilterSet):
+    """
+    Фильтры рецептов через EXISTS-подзапросы: без JOIN по тегам,
+    избранному и корзине и без последующего DISTINCT.
+    """
+
+    TAGS_MATCH_ANY = "any"
+    TAGS_MATCH_ALL = "all"
+
+    tags = MultipleCharFilter(method="filter_tags")
+    tags_match = filters.ChoiceFilter(
+        choices=((TAGS_MATCH_ANY, TAGS_MATCH_ANY), (TAGS_MATCH_ALL, TAGS_MATCH_ALL)),
+        method="filter_noop",
+    )
+    author = filters.NumberFilter(field_name="author_id")
+    is_favorited = filters.BooleanFilter(method="filter_user_flag")
+    is_in_shopping_cart = filters.BooleanFilter(method="filter_user_flag")
+    search = filters.CharFilter(method="filter_search")
+
+    class Meta:
+        model = Recipe
+        fields = (
+            "tags",
+            "tags_match",
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+        )
+
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+    def filter_tags(self, queryset, name, value):
+        slugs = set(value)
+        if self.data.get("tags_match") == self.TAGS_MATCH_ALL:
+            for slug in slugs:
+                queryset = queryset.filter(
+                    Exists(
+                        TagRecipe.objects.filter(recipe=OuterRef("pk"), tag__slug=slug)
+                    )
+                )
+            return queryset
+        return queryset.filter(
+            Exists(TagRecipe.objects.filter(recipe=OuterRef("pk"), tag__slug__in=slugs))
+        )
+
+    def filter_user_flag(self, queryset, name, value):
+        """Флаги уже посчитаны аннотацией Exists в RecipeViewSet.get_queryset"""
+        if not value or self.request.user.is_anonymous:
+            return queryset
+        return queryset.filter(**{name: True})
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """При ?search= по умолчанию сортирует по релевантности"""
+
+    def get_default_ordering(self, view):
+        if view.request.query_params.get("search", "").strip():
+            return ("-search_rank", "-id")
+        return super().get_default_ordering(view)
@@ -0,0 +1,151 @@
+"""Обработка картинок рецептов: лимиты, перекодирование и превью в фоне"""
+import base64
+import io
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps, features
+
+from .caching import invalidate_recipe_scopes
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_QUALITY = 30
+
+_executor = None
+
+
+class RecipeImageField(Base64ImageField):
+    """Base64ImageField, который отклоняет слишком большие файлы до декодирования"""
+
+    def to_internal_value(self, base64_data):
+        if (
+            isinstance(base64_data, str)
+            and len(base64_data) > settings.RECIPE_IMAGE_MAX_BYTES * 4 // 3 + 128
+        ):
+            raise ValidationError(
+                "Размер картинки не должен превышать {} байт".format(
+                    settings.RECIPE_IMAGE_MAX_BYTES
+                )
+            )
+        return super().to_internal_value(base64_data)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix="recipe-images",
+        )
+    return _executor
+
+
+def get_output_format():
+    if features.check("webp"):
+        return "WEBP", "webp"
+    return "JPEG", "jpg"
+
+
+def encode_image(image, max_side, image_format, quality=None):
+    image = image.copy()
+    image.thumbnail((max_side, max_side))
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format=image_format,
+        quality=quality or settings.RECIPE_IMAGE_QUALITY,
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def encode_placeholder(image, image_format):
+    """Крошечная копия картинки в виде data URI для мгновенного превью"""
+    content = encode_image(
+        image,
+        settings.RECIPE_PLACEHOLDER_SIDE,
+        image_format,
+        quality=PLACEHOLDER_QUALITY,
+    )
+    return "data:image/{};base64,{}".format(
+        image_format.lower(), base64.b64encode(content.read()).decode()
+    )
+
+
+def process_recipe_image(recipe_id):
+    """
+    Перекодирует картинку рецепта в WebP (или JPEG) с ограничением размера,
+    создаёт превью и data URI заглушку. Старые файлы удаляются,
+    если картинку не успели заменить.
+    """
+    try:
+        recipe = Recipe.objects.get(id=recipe_id)
+        with recipe.image.open("rb") as image_file:
+            image = Image.open(image_file)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+
+        image_format, extension = get_output_format()
+        image_field = Recipe._meta.get_field("image")
+        thumbnail_field = Recipe._meta.get_field("thumbnail")
+        file_name = "{}.{}".format(uuid.uuid4(), extension)
+        new_image = image_field.storage.save(
+            image_field.generate_filename(recipe, file_name),
+            encode_image(image, settings.RECIPE_IMAGE_MAX_SIDE, image_format),
+        )
+        new_thumbnail = thumbnail_field.storage.save(
+            thumbnail_field.generate_filename(recipe, file_name),
+            encode_image(image, settings.RECIPE_THUMBNAIL_SIDE, image_format),
+        )
+
+        updated = Recipe.objects.filter(id=recipe_id, image=recipe.image.name).update(
+            image=new_image,
+            thumbnail=new_thumbnail,
+            placeholder=encode_placeholder(image, image_format),
+        )
+        if updated:
+            stale_files = (
+                (image_field.storage, recipe.image.name),
+                (thumbnail_field.storage, recipe.thumbnail.name),
+            )
+            invalidate_recipe_scopes(
+                recipe.id,
+                recipe.author_id,
+                recipe.tags.values_list("slug", flat=True),
+            )
+        else:
+            stale_files = (
+                (image_field.storage, new_image),
+                (thumbnail_field.storage, new_thumbnail),
+            )
+        for storage, name in stale_files:
+            if name:
+                storage.delete(name)
+    except Exception:
+        logger.exception("Не удалось обработать картинку рецепта %s", recipe_id)
+
+
+def process_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(recipe_id):
+    """Ставит обработку в пул после коммита транзакции с новой картинкой"""
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
+        return
+    transaction.on_commit(lambda: get_executor().submit(process_in_worker, recipe_id))
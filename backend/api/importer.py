@@ -0,0 +1,613 @@
+"""Потоковый импорт справочников и рецептов пакетами с upsert"""
+import csv
+import io
+import json
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+
+from users.models import Subscribers
+
+from .caching import bump_catalog_version, invalidate_scopes
+from .counters import count_subquery
+from .feed import backfill_feed, fan_out_recipes
+from .ingredient_index import ingredient_index
+from .models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    TagRecipe,
+)
+from .recipe_matcher import recipe_match_index
+from .signals import RECIPE_FILE_FIELDS
+from .storage import acquire_files
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+ON_CONFLICT = ("ignore", "update")
+
+JSON_SEPARATORS = re.compile(r"[\s,]*")
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_json_array(file, chunk_size=CHUNK_SIZE):
+    """Читает объекты JSON-массива по одному, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ImportRowError("Ожидался JSON-массив объектов")
+    position = 1
+    eof = False
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith("]", position):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if not isinstance(item, dict):
+            raise ImportRowError("Ожидался JSON-массив объектов")
+        yield item
+        position = end
+
+
+def read_json_lines(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_rows(file, file_format):
+    if file_format == "csv":
+        return csv.DictReader(file)
+    if file_format == "jsonl":
+        return read_json_lines(file)
+    if file_format == "json":
+        return read_json_array(file)
+    raise ImportRowError("Неизвестный формат файла: {}".format(file_format))
+
+
+def parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise ImportRowError("Неверный uuid {}".format(value))
+
+
+def get_file_format(path):
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+
+def batched(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class ModelImporter:
+    """
+    Импорт плоской модели с уникальным ключом key_fields.
+    На PostgreSQL пакет загружается через COPY во временную таблицу
+    и INSERT ... ON CONFLICT, на остальных БД - через bulk_create/bulk_update.
+    """
+
+    model = None
+    key_fields = ()
+    update_fields = ()
+    formats = ("csv", "json", "jsonl")
+
+    @property
+    def fields(self):
+        return self.key_fields + self.update_fields
+
+    def prepare(self, row):
+        try:
+            return {field: str(row[field]).strip() for field in self.fields}
+        except KeyError as error:
+            raise ImportRowError("Нет поля {}".format(error))
+
+    def get_key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    def deduplicate(self, rows):
+        """Последняя строка с одинаковым ключом побеждает"""
+        unique = {}
+        for row in rows:
+            values = self.prepare(row)
+            unique[self.get_key(values)] = values
+        return unique
+
+    def get_existing(self, keys):
+        first_field = self.key_fields[0]
+        existing = self.model.objects.filter(
+            **{first_field + "__in": {key[0] for key in keys}}
+        ).values_list(*self.key_fields, "pk")
+        return {
+            tuple(values[:-1]): values[-1]
+            for values in existing
+            if tuple(values[:-1]) in keys
+        }
+
+    def import_batch(self, rows, on_conflict):
+        unique = self.deduplicate(rows)
+        existing = self.get_existing(unique)
+        new_objects = [
+            self.model(**values)
+            for key, values in unique.items()
+            if key not in existing
+        ]
+        self.model.objects.bulk_create(new_objects, ignore_conflicts=True)
+        # Конфликтующие строки БД пропускает молча, считаются только вставленные
+        result = Counter(created=len(self.get_existing(unique)) - len(existing))
+        if on_conflict == "update" and self.update_fields:
+            changed = [
+                self.model(pk=existing[key], **values)
+                for key, values in unique.items()
+                if key in existing
+            ]
+            self.model.objects.bulk_update(changed, self.update_fields)
+            result["updated"] = len(changed)
+        result["skipped"] = len(rows) - result["created"] - result["updated"]
+        return result
+
+    def copy_batch(self, rows, on_conflict):
+        unique = self.deduplicate(rows)
+        opts = self.model._meta
+        columns = [opts.get_field(field).column for field in self.fields]
+        key_columns = [opts.get_field(field).column for field in self.key_fields]
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [values[field] for field in self.fields] for values in unique.values()
+        )
+        buffer.seek(0)
+        if on_conflict == "update" and self.update_fields:
+            conflict_action = "UPDATE SET " + ", ".join(
+                "{0} = EXCLUDED.{0}".format(opts.get_field(field).column)
+                for field in self.update_fields
+            )
+        else:
+            conflict_action = "NOTHING"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE import_buffer ON COMMIT DROP AS "
+                "SELECT {columns} FROM {table} WITH NO DATA".format(
+                    columns=", ".join(columns), table=opts.db_table
+                )
+            )
+            cursor.copy_expert(
+                "COPY import_buffer ({}) FROM STDIN WITH (FORMAT csv)".format(
+                    ", ".join(columns)
+                ),
+                buffer,
+            )
+            cursor.execute(
+                "INSERT INTO {table} ({columns}) SELECT {columns} FROM import_buffer "
+                "ON CONFLICT ({keys}) DO {action} RETURNING (xmax = 0)".format(
+                    table=opts.db_table,
+                    columns=", ".join(columns),
+                    keys=", ".join(key_columns),
+                    action=conflict_action,
+                )
+            )
+            result = Counter(
+                "created" if inserted else "updated"
+                for (inserted,) in cursor.fetchall()
+            )
+        result["skipped"] = len(rows) - result["created"] - result["updated"]
+        return result
+
+    def can_copy(self):
+        return connection.vendor == "postgresql"
+
+    def after_import(self):
+        bump_catalog_version()
+
+
+class IngredientImporter(ModelImporter):
+    model = Ingredient
+    key_fields = ("name", "measurement_unit")
+
+    def after_import(self):
+        super().after_import()
+        ingredient_index.invalidate()
+
+
+class TagImporter(ModelImporter):
+    model = Tag
+    key_fields = ("slug",)
+    update_fields = ("name", "color")
+
+
+class UserImporter(ModelImporter):
+    """
+    Пользователи переносятся вместе с хэшами паролей. COPY не используется:
+    у date_joined и счётчиков нет значений по умолчанию в самой БД.
+    """
+
+    model = User
+    key_fields = ("email",)
+    update_fields = (
+        "username",
+        "first_name",
+        "last_name",
+        "password",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+    )
+
+    def can_copy(self):
+        return False
+
+    def after_import(self):
+        pass
+
+
+def get_user_ids(emails):
+    return dict(User.objects.filter(email__in=emails).values_list("email", "id"))
+
+
+class RecipeImporter:
+    """
+    Импорт рецептов из JSON/JSONL. Автор задаётся email, теги - слагами,
+    ингредиенты - парами name/measurement_unit с amount, image - именем
+    уже загруженного файла, uuid (есть в выгрузке export_data) - ключ,
+    по которому на рецепт ссылаются избранное и списки покупок. Рецепт
+    ищется по uuid, а в строках без uuid - по автору и названию; повторы
+    ключа в пакете считаются в duplicates, побеждает последняя строка.
+    """
+
+    update_fields = (
+        "name",
+        "text",
+        "cooking_time",
+        "image",
+        "thumbnail",
+        "placeholder",
+    )
+    formats = ("json", "jsonl")
+
+    def can_copy(self):
+        return False
+
+    def get_references(self, rows):
+        authors = get_user_ids({row.get("author") for row in rows})
+        tags = dict(
+            Tag.objects.filter(
+                slug__in={slug for row in rows for slug in row.get("tags", ())}
+            ).values_list("slug", "id")
+        )
+        ingredients = {
+            (name, measurement_unit): ingredient_id
+            for name, measurement_unit, ingredient_id in Ingredient.objects.filter(
+                name__in={
+                    item.get("name")
+                    for row in rows
+                    for item in row.get("ingredients", ())
+                }
+            ).values_list("name", "measurement_unit", "id")
+        }
+        return authors, tags, ingredients
+
+    def prepare(self, row, authors, tags, ingredients):
+        try:
+            author_id = authors[row["author"]]
+        except KeyError:
+            raise ImportRowError("Нет автора {}".format(row.get("author")))
+        try:
+            tag_ids = {tags[slug] for slug in row.get("tags", ())}
+        except KeyError as error:
+            raise ImportRowError("Нет тега {}".format(error))
+        amounts = {}
+        for item in row.get("ingredients", ()):
+            key = (item.get("name"), item.get("measurement_unit"))
+            if key not in ingredients:
+                raise ImportRowError("Нет ингредиента {} ({})".format(*key))
+            amounts[ingredients[key]] = int(item["amount"])
+        try:
+            recipe = Recipe(
+                author_id=author_id,
+                name=row["name"],
+                text=row["text"],
+                cooking_time=int(row["cooking_time"]),
+                image=row.get("image", ""),
+                thumbnail=row.get("thumbnail", ""),
+                placeholder=row.get("placeholder", ""),
+            )
+        except KeyError as error:
+            raise ImportRowError("Нет поля {}".format(error))
+        if row.get("uuid"):
+            recipe.uuid = parse_uuid(row["uuid"])
+        return recipe, tag_ids, amounts
+
+    @staticmethod
+    def get_key(recipe, row):
+        if row.get("uuid"):
+            return recipe.uuid
+        return (recipe.author_id, recipe.name)
+
+    @staticmethod
+    def get_recipe_ids(keys):
+        recipe_uuids = {key for key in keys if isinstance(key, uuid.UUID)}
+        names = {key for key in keys if not isinstance(key, uuid.UUID)}
+        recipe_ids = dict(
+            Recipe.objects.filter(uuid__in=recipe_uuids).values_list("uuid", "id")
+        )
+        if names:
+            recipe_ids.update(
+                ((author_id, name), recipe_id)
+                for author_id, name, recipe_id in Recipe.objects.filter(
+                    author_id__in={key[0] for key in names},
+                    name__in={key[1] for key in names},
+                ).values_list("author_id", "name", "id")
+                if (author_id, name) in names
+            )
+        return recipe_ids
+
+    def import_batch(self, rows, on_conflict):
+        authors, tags, ingredients = self.get_references(rows)
+        result = Counter()
+        unique = {}
+        for row in rows:
+            recipe, tag_ids, amounts = self.prepare(row, authors, tags, ingredients)
+            key = self.get_key(recipe, row)
+            if key in unique:
+                result["duplicates"] += 1
+            unique[key] = (recipe, tag_ids, amounts)
+
+        existing = self.get_recipe_ids(unique)
+        new_recipes = [
+            recipe for key, (recipe, _, _) in unique.items() if key not in existing
+        ]
+        Recipe.objects.bulk_create(new_recipes, batch_size=BATCH_SIZE)
+        result["created"] = len(new_recipes)
+        linked = [key for key in unique if key not in existing]
+        if on_conflict == "update":
+            stale_files = [
+                name
+                for names in Recipe.objects.filter(
+                    id__in=existing.values()
+                ).values_list(*RECIPE_FILE_FIELDS)
+                for name in names
+            ]
+            changed = []
+            for key, recipe_id in existing.items():
+                recipe = unique[key][0]
+                recipe.id = recipe_id
+                changed.append(recipe)
+            Recipe.objects.bulk_update(changed, self.update_fields)
+            TagRecipe.objects.filter(recipe_id__in=existing.values()).delete()
+            RecipeIngredient.objects.filter(recipe_id__in=existing.values()).delete()
+            storage = Recipe._meta.get_field("image").storage
+            for name in stale_files:
+                storage.delete(name)
+            result["updated"] = len(changed)
+            linked += existing
+        result["skipped"] = (
+            len(rows) - result["created"] - result["updated"] - result["duplicates"]
+        )
+
+        recipe_ids = self.get_recipe_ids(unique)
+        acquire_files(
+            getattr(unique[key][0], field).name
+            for key in linked
+            for field in RECIPE_FILE_FIELDS
+        )
+        TagRecipe.objects.bulk_create(
+            (
+                TagRecipe(recipe_id=recipe_ids[key], tag_id=tag_id)
+                for key in linked
+                for tag_id in unique[key][1]
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_ids[key],
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for key in linked
+                for ingredient_id, amount in unique[key][2].items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        author_ids = {unique[key][0].author_id for key in linked}
+        User.objects.filter(id__in=author_ids).update(
+            recipes_count=count_subquery(Recipe, "author")
+        )
+        fan_out_recipes(
+            (recipe_ids[key], unique[key][0].author_id)
+            for key in unique
+            if key not in existing
+        )
+        invalidate_scopes(
+            ["recipes"]
+            + ["author:{}".format(author_id) for author_id in author_ids]
+            + ["recipe:{}".format(recipe_ids[key]) for key in linked]
+            + ["tag:{}".format(slug) for slug in tags]
+        )
+        return result
+
+    def after_import(self):
+        recipe_match_index.invalidate()
+
+
+class LinkImporter:
+    """
+    Импорт связей пользователя с рецептом или автором. Пользователь задаётся
+    email, цель связи - значением уникального поля target_key модели
+    target_model из колонки target_column. Существующие связи пропускаются.
+    """
+
+    model = None
+    target_field = None
+    target_model = None
+    target_key = None
+    target_column = None
+    formats = ("csv", "json", "jsonl")
+
+    def can_copy(self):
+        return False
+
+    def get_target_key(self, row):
+        value = row.get(self.target_column)
+        try:
+            return self.target_model._meta.get_field(self.target_key).to_python(value)
+        except ValidationError:
+            raise ImportRowError(
+                "Неверное значение {} {}".format(self.target_column, value)
+            )
+
+    def get_targets(self, rows):
+        return dict(
+            self.target_model.objects.filter(
+                **{self.target_key + "__in": {self.get_target_key(row) for row in rows}}
+            ).values_list(self.target_key, "id")
+        )
+
+    def get_existing(self, links):
+        return links & set(
+            self.model.objects.filter(
+                user_id__in={user_id for user_id, _ in links},
+                **{self.target_field + "_id__in": {target for _, target in links}}
+            ).values_list("user_id", self.target_field + "_id")
+        )
+
+    def import_batch(self, rows, on_conflict):
+        users = get_user_ids({row.get("user") for row in rows})
+        targets = self.get_targets(rows)
+        links = set()
+        for row in rows:
+            if row.get("user") not in users:
+                raise ImportRowError("Нет пользователя {}".format(row.get("user")))
+            key = self.get_target_key(row)
+            if key not in targets:
+                raise ImportRowError("Нет {} {}".format(self.target_column, key))
+            links.add((users[row["user"]], targets[key]))
+        existing = self.get_existing(links)
+        self.model.objects.bulk_create(
+            (
+                self.model(user_id=user_id, **{self.target_field + "_id": target_id})
+                for user_id, target_id in links - existing
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # Вставленные строки, а не отправленные: конфликты БД пропускает молча
+        new_links = self.get_existing(links) - existing
+        self.after_batch(new_links)
+        return Counter(created=len(new_links), skipped=len(rows) - len(new_links))
+
+    def after_batch(self, new_links):
+        pass
+
+    def after_import(self):
+        pass
+
+
+class RecipeLinkImporter(LinkImporter):
+    target_field = "recipe"
+    target_model = Recipe
+    target_key = "uuid"
+    target_column = "recipe"
+    counter_field = None
+
+    def after_batch(self, new_links):
+        Recipe.objects.filter(id__in={recipe_id for _, recipe_id in new_links}).update(
+            **{self.counter_field: count_subquery(self.model, "recipe")}
+        )
+
+
+class FavoriteImporter(RecipeLinkImporter):
+    model = Favorite
+    counter_field = "favorites_count"
+
+
+class CartImporter(RecipeLinkImporter):
+    model = Cart
+    counter_field = "carts_count"
+
+
+class SubscriptionImporter(LinkImporter):
+    model = Subscribers
+    target_field = "subscribed"
+    target_model = User
+    target_key = "email"
+    target_column = "author"
+
+    def after_batch(self, new_links):
+        for user_id, author_id in new_links:
+            backfill_feed(User(id=user_id), User(id=author_id))
+
+
+IMPORTERS = {
+    "users": UserImporter,
+    "ingredients": IngredientImporter,
+    "tags": TagImporter,
+    "recipes": RecipeImporter,
+    "subscriptions": SubscriptionImporter,
+    "favorites": FavoriteImporter,
+    "carts": CartImporter,
+}
+
+
+def import_file(kind, path, batch_size=BATCH_SIZE, on_conflict="ignore", use_copy=True):
+    """
+    Импортирует файл пакетами по batch_size строк, каждый пакет
+    в своей транзакции. Возвращает счётчики created/updated/skipped/
+    duplicates/rows и время в секундах.
+    """
+    importer = IMPORTERS[kind]()
+    file_format = get_file_format(path)
+    if file_format not in importer.formats:
+        raise ImportRowError(
+            "Формат {} не поддерживается для {}".format(file_format, kind)
+        )
+    import_batch = (
+        importer.copy_batch
+        if use_copy and importer.can_copy()
+        else importer.import_batch
+    )
+    result = Counter()
+    started = time.monotonic()
+    with open(path, "rt", encoding="utf8", newline="") as file:
+        for batch in batched(read_rows(file, file_format), batch_size):
+            try:
+                with transaction.atomic():
+                    result += import_batch(batch, on_conflict)
+            except (DatabaseError, ValueError, TypeError) as error:
+                raise ImportRowError(
+                    "Строки {}-{}: {}".format(
+                        result["rows"] + 1, result["rows"] + len(batch), error
+                    )
+                )
+            result["rows"] += len(batch)
+    importer.after_import()
+    return result, time.monotonic() - started
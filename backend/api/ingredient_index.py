@@ -0,0 +1,72 @@
+"""Индекс названий ингредиентов в памяти процесса для поиска по префиксу"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Ingredient
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный массив названий в нижнем регистре.
+    Строится лениво при первом запросе и перестраивается после
+    изменения ингредиентов или по истечении INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._index = None
+
+    def _is_stale(self):
+        return (
+            self._index is None
+            or time.monotonic() - self._built_at > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _build(self):
+        with self._lock:
+            if not self._is_stale():
+                return self._index
+            rows = sorted(
+                (name.lower(), id, name, measurement_unit)
+                for id, name, measurement_unit in Ingredient.objects.values_list(
+                    "id", "name", "measurement_unit"
+                ).iterator()
+            )
+            self._index = (
+                [row[0] for row in rows],
+                [
+                    Ingredient(id=id, name=name, measurement_unit=measurement_unit)
+                    for _, id, name, measurement_unit in rows
+                ],
+            )
+            self._built_at = time.monotonic()
+            return self._index
+
+    def search(self, terms, limit=None):
+        """Ингредиенты, название которых начинается с каждого из terms"""
+        index = self._index
+        if index is None or self._is_stale():
+            index = self._build()
+        keys, items = index
+        terms = [term.lower() for term in terms]
+        prefix = max(terms, key=len)
+        if not all(prefix.startswith(term) for term in terms):
+            return []
+
+        found = []
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            found.append(items[position])
+            position += 1
+        found.sort(key=lambda ingredient: ingredient.id, reverse=True)
+        return found[:limit] if limit else found
+
+
+ingredient_index = IngredientPrefixIndex()
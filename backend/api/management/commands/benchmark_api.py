@@ -0,0 +1,255 @@
+"""Нагрузочный бенчмарк публичного API на синтетических данных"""
+import json
+import math
+import resource
+import statistics
+import time
+import tracemalloc
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.counters import recount_counters
+from api.models import Cart, Favorite, Recipe
+from api.synthetic import seed_dataset
+
+User = get_user_model()
+
+PNG = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR4"
+    "2mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+PERCENTILES = (50, 90, 99)
+HEADER_FORMAT = "{:<20}{:>9}{:>9}{:>9}{:>9}{:>6}{:>10}"
+ROW_FORMAT = (
+    "{:<20}{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{max:>9.1f}{queries:>6}{peak_kib:>10.0f}"
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    """
+    Засевает БД синтетическими данными внутри транзакции и гоняет реальные
+    эндпоинты через тестовый клиент: задержки (p50/p90/p99), запросы к БД
+    и память на запрос. Результаты можно сохранить в JSON и сравнить
+    с прогоном на другом коммите. В конце транзакция откатывается.
+    """
+
+    help = "Бенчмарк эндпоинтов API: задержки, запросы к БД и память"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--ingredients", type=int, default=1000)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--follows", type=int, default=20)
+        parser.add_argument("--favorites", type=int, default=50)
+        parser.add_argument("--carts", type=int, default=10)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--only", action="append", default=[], help="Имя эндпоинта из отчёта"
+        )
+        parser.add_argument("--output", help="Сохранить результаты в JSON")
+        parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+
+    def get_endpoints(self, dataset):
+        recipe_id = dataset["recipes"][0]
+        author_id = dataset["users"][1]
+        tags = "tags=synthetic-0&tags=synthetic-1"
+        # Последняя страница по 6 рецептов существует при любом --recipes
+        last_page = math.ceil(len(dataset["recipes"]) / 6)
+        return (
+            ("recipes", "/api/recipes/?limit=6"),
+            (
+                "recipes_last_page",
+                "/api/recipes/?limit=6&page={}".format(last_page),
+            ),
+            ("recipes_cursor", "/api/recipes/?limit=6&cursor="),
+            ("recipes_tags", "/api/recipes/?limit=6&" + tags),
+            ("recipes_tags_all", "/api/recipes/?limit=6&tags_match=all&" + tags),
+            ("recipes_author", "/api/recipes/?limit=6&author={}".format(author_id)),
+            ("recipes_favorited", "/api/recipes/?limit=6&is_favorited=1"),
+            ("recipes_in_cart", "/api/recipes/?limit=6&is_in_shopping_cart=1"),
+            ("recipes_search", "/api/recipes/?limit=6&search=рецепт 42"),
+            (
+                "recipes_match",
+                "/api/recipes/match/?limit=6&ingredients={}".format(
+                    ",".join(map(str, dataset["ingredients"][:10]))
+                ),
+            ),
+            ("recipe_detail", "/api/recipes/{}/".format(recipe_id)),
+            ("ingredient_search", "/api/ingredients/?name=synthetic 1"),
+            ("subscriptions", "/api/users/subscriptions/?limit=6&recipes_limit=3"),
+            ("shopping_cart_txt", "/api/recipes/download_shopping_cart/"),
+            (
+                "shopping_cart_csv",
+                "/api/recipes/download_shopping_cart/?file_format=csv",
+            ),
+            ("recipe_create", None),
+        )
+
+    def get_create_payload(self, dataset, number):
+        return {
+            "name": "benchmark рецепт {}".format(number),
+            "text": "Описание",
+            "cooking_time": 10,
+            "image": PNG,
+            "tags": dataset["tags"][:2],
+            "ingredients": [
+                {"id": ingredient_id, "amount": 100}
+                for ingredient_id in dataset["ingredients"][:8]
+            ],
+        }
+
+    def request(self, client, dataset, url, number):
+        if url is None:
+            response = client.post(
+                "/api/recipes/",
+                json.dumps(self.get_create_payload(dataset, number)),
+                content_type="application/json",
+            )
+        else:
+            response = client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        if response.status_code not in (200, 201):
+            raise CommandError(
+                "{} вернул {}".format(url or "POST /api/recipes/", response.status_code)
+            )
+
+    def measure(self, client, dataset, url, options):
+        numbers = count()
+        for _ in range(options["warmup"]):
+            self.request(client, dataset, url, next(numbers))
+        timings = []
+        queries = []
+        for _ in range(options["iterations"]):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                self.request(client, dataset, url, next(numbers))
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context))
+        # Память меряется отдельным запросом: tracemalloc замедляет код
+        tracemalloc.start()
+        self.request(client, dataset, url, next(numbers))
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {"p{}".format(p): percentile(timings, p) for p in PERCENTILES}
+        result.update(
+            mean=statistics.mean(timings),
+            max=max(timings),
+            queries=max(queries),
+            peak_kib=peak_memory / 1024,
+        )
+        return result
+
+    def seed(self, options):
+        dataset = seed_dataset(
+            users=options["users"],
+            recipes=options["recipes"],
+            ingredients=options["ingredients"],
+            ingredients_per_recipe=options["ingredients_per_recipe"],
+            follows=options["follows"],
+            favorites=options["favorites"],
+            carts=options["carts"],
+            random_seed=options["seed"],
+        )
+        recount_counters(User, Recipe, Favorite, Cart)
+        return dataset
+
+    def run(self, options):
+        started = time.perf_counter()
+        dataset = self.seed(options)
+        self.stdout.write(
+            "Данные засеяны за {:.1f} с".format(time.perf_counter() - started)
+        )
+        token = Token.objects.create(user_id=dataset["users"][0])
+        client = Client(HTTP_AUTHORIZATION="Token {}".format(token.key))
+        results = {}
+        for name, url in self.get_endpoints(dataset):
+            if options["only"] and name not in options["only"]:
+                continue
+            results[name] = self.measure(client, dataset, url, options)
+        return results
+
+    def load_previous(self, path):
+        try:
+            with open(path, encoding="utf8") as file:
+                return json.load(file)["results"]
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError("Не удалось прочитать {}: {}".format(path, error))
+
+    def report(self, results, previous):
+        header = HEADER_FORMAT.format(
+            "эндпоинт", "p50 мс", "p90 мс", "p99 мс", "max мс", "SQL", "пик КиБ"
+        )
+        if previous:
+            header += "{:>12}".format("Δp50")
+        self.stdout.write(header)
+        for name, result in results.items():
+            line = ROW_FORMAT.format(name, **result)
+            if name in previous:
+                old = previous[name]
+                line += "{:>+11.0f}%".format(
+                    (result["p50"] / old["p50"] - 1) * 100 if old["p50"] else 0
+                )
+                if result["queries"] != old["queries"]:
+                    line += self.style.WARNING(
+                        "  SQL {} -> {}".format(old["queries"], result["queries"])
+                    )
+            self.stdout.write(line)
+        self.stdout.write(
+            "Пик RSS процесса: {:.0f} МиБ".format(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options["recipes"] < 1 or options["users"] < 2:
+            raise CommandError("Нужны хотя бы 1 рецепт и 2 пользователя")
+        previous = self.load_previous(options["compare"]) if options["compare"] else {}
+        try:
+            with transaction.atomic():
+                results = self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        self.report(results, previous)
+        if options["output"]:
+            scale = (
+                "users",
+                "recipes",
+                "ingredients",
+                "ingredients_per_recipe",
+                "follows",
+                "favorites",
+                "carts",
+                "iterations",
+            )
+            with open(options["output"], "w", encoding="utf8") as file:
+                json.dump(
+                    {
+                        "database": connection.vendor,
+                        "scale": {key: options[key] for key in scale},
+                        "results": results,
+                    },
+                    file,
+                    ensure_ascii=False,
+                    indent=2,
+                )
@@ -0,0 +1,131 @@
+"""Проверка планов запросов API на синтетических данных"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.synthetic import seed_dataset
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Засевает БД синтетическими данными внутри транзакции, выполняет запросы
+    к эндпоинтам, делает EXPLAIN каждого SELECT с enable_seqscan = off
+    и падает, если где-то остался Seq Scan с условием фильтрации.
+    В конце транзакция откатывается.
+    """
+
+    help = "Проверяет, что запросы эндпоинтов не используют Seq Scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--ingredients", type=int, default=1000)
+        parser.add_argument(
+            "--allow-table",
+            action="append",
+            default=[],
+            help="Таблица, для которой последовательное чтение допустимо",
+        )
+
+    def get_endpoints(self, dataset):
+        recipe_id = dataset["recipes"][0]
+        author_id = dataset["users"][1]
+        return (
+            "/api/recipes/?limit=10",
+            "/api/recipes/?limit=10&page=5",
+            "/api/recipes/?limit=10&cursor=",
+            "/api/recipes/?limit=10&tags=synthetic-0&tags=synthetic-1",
+            "/api/recipes/?limit=10&tags=synthetic-0&tags=synthetic-1&tags_match=all",
+            "/api/recipes/?limit=10&author={}".format(author_id),
+            "/api/recipes/?limit=10&is_favorited=1",
+            "/api/recipes/?limit=10&is_in_shopping_cart=1",
+            "/api/recipes/?limit=10&search=рецепт 42",
+            "/api/recipes/{}/".format(recipe_id),
+            "/api/recipes/download_shopping_cart/",
+            "/api/users/subscriptions/?limit=6",
+            "/api/users/{}/".format(author_id),
+            "/api/tags/",
+            "/api/ingredients/?name=synth",
+        )
+
+    def find_seq_scans(self, plan, allowed_tables):
+        """Узлы Seq Scan с Filter - чтение таблицы целиком ради условия"""
+        found = []
+        if (
+            plan.get("Node Type") == "Seq Scan"
+            and "Filter" in plan
+            and plan.get("Relation Name") not in allowed_tables
+        ):
+            found.append("{} ({})".format(plan["Relation Name"], plan["Filter"]))
+        for child in plan.get("Plans", ()):
+            found += self.find_seq_scans(child, allowed_tables)
+        return found
+
+    def prepare_planner(self):
+        """Свежая статистика и запрет Seq Scan везде, где есть индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def explain(self, sql, allowed_tables):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return self.find_seq_scans(plan[0]["Plan"], allowed_tables)
+
+    def check(self, options):
+        dataset = seed_dataset(
+            users=options["users"],
+            recipes=options["recipes"],
+            ingredients=options["ingredients"],
+        )
+        self.prepare_planner()
+        token = Token.objects.create(user_id=dataset["users"][0])
+        client = Client(HTTP_AUTHORIZATION="Token {}".format(token.key))
+        failures = 0
+        for url in self.get_endpoints(dataset):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            if response.status_code != 200:
+                raise CommandError("{} вернул {}".format(url, response.status_code))
+            for query in context.captured_queries:
+                sql = query["sql"]
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                seq_scans = self.explain(sql, options["allow_table"])
+                if seq_scans:
+                    failures += 1
+                    self.stdout.write(
+                        self.style.ERROR(
+                            "{}: Seq Scan по {}\n    {}".format(
+                                url, ", ".join(seq_scans), sql
+                            )
+                        )
+                    )
+            self.stdout.write("{}: запросов {}".format(url, len(context)))
+        return failures
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Проверка планов запросов работает только с PostgreSQL")
+        try:
+            with transaction.atomic():
+                failures = self.check(options)
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError("Запросов с Seq Scan: {}".format(failures))
+        self.stdout.write(self.style.SUCCESS("Seq Scan с фильтрацией не найдено"))
@@ -0,0 +1,39 @@
+"""Перенос уже загруженных картинок рецептов в хранилище по содержимому"""
+from django.core.management.base import BaseCommand
+
+from api.caching import invalidate_recipe_scopes
+from api.models import Recipe
+from api.signals import RECIPE_FILE_FIELDS
+
+
+class Command(BaseCommand):
+    """
+    Пересохраняет файлы рецептов через ContentAddressedStorage: одинаковые
+    картинки схлопываются в один файл, старые имена освобождаются.
+    """
+
+    help = "Переименовывает картинки рецептов по хэшу содержимого"
+
+    def handle(self, *args, **options):
+        renamed = 0
+        for recipe in Recipe.objects.iterator():
+            for field_name in RECIPE_FILE_FIELDS:
+                field_file = getattr(recipe, field_name)
+                if not field_file or not field_file.storage.exists(field_file.name):
+                    continue
+                with field_file.open("rb"):
+                    new_name = field_file.storage.save(field_file.name, field_file)
+                updated = new_name != field_file.name and Recipe.objects.filter(
+                    id=recipe.id, **{field_name: field_file.name}
+                ).update(**{field_name: new_name})
+                field_file.storage.delete(field_file.name if updated else new_name)
+                if updated:
+                    renamed += 1
+                    invalidate_recipe_scopes(
+                        recipe.id,
+                        recipe.author_id,
+                        recipe.tags.values_list("slug", flat=True),
+                    )
+        self.stdout.write(
+            self.style.SUCCESS("Переименовано файлов: {}".format(renamed))
+        )
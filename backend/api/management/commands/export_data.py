@@ -0,0 +1,51 @@
+"""Выгрузка данных для резервной копии или переноса"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exporter import CHUNK_SIZE, EXPORTS, WRITERS, export_file, snapshot
+
+
+class Command(BaseCommand):
+    """
+    Построчно выгружает таблицы через серверные курсоры, не загружая
+    их в память, в одной транзакции REPEATABLE READ. Файлы <вид>.<формат>
+    загружаются обратно через import_data в порядке: users, tags,
+    ingredients, recipes, subscriptions, favorites, carts.
+    """
+
+    help = "Выгружает данные в JSONL/CSV, совместимые с import_data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "kinds", nargs="*", help="Что выгрузить: {}".format(", ".join(EXPORTS))
+        )
+        parser.add_argument("--output-dir", default=".")
+        parser.add_argument("--format", choices=WRITERS, default="jsonl")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        os.makedirs(options["output_dir"], exist_ok=True)
+        unknown = set(options["kinds"]) - set(EXPORTS)
+        if unknown:
+            raise CommandError("Неизвестные виды данных: {}".format(", ".join(unknown)))
+        with snapshot():
+            for kind in options["kinds"] or EXPORTS:
+                self.export(kind, options)
+
+    def export(self, kind, options):
+        file_format = options["format"]
+        if file_format not in EXPORTS[kind].formats:
+            file_format = EXPORTS[kind].formats[-1]
+        path = os.path.join(options["output_dir"], "{}.{}".format(kind, file_format))
+        try:
+            count, elapsed = export_file(kind, path, file_format, options["chunk_size"])
+        except (OSError, ValueError) as error:
+            raise CommandError("{}: {}".format(path, error))
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{}: строк {} за {:.2f} с ({:.0f} строк/с)".format(
+                    path, count, elapsed, count / elapsed if elapsed else 0
+                )
+            )
+        )
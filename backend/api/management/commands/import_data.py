@@ -0,0 +1,52 @@
+"""Импорт ингредиентов, тегов и рецептов из CSV/JSON/JSONL"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import BATCH_SIZE, IMPORTERS, ON_CONFLICT, import_file
+
+
+class Command(BaseCommand):
+    """
+    Потоково читает файлы и загружает их пакетами: повторный запуск
+    не падает на уникальных ограничениях, а пропускает или обновляет строки.
+    """
+
+    help = "Импортирует данные из CSV, JSON или JSONL файлов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=IMPORTERS)
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--on-conflict", choices=ON_CONFLICT, default="ignore")
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Не использовать COPY на PostgreSQL",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            try:
+                result, elapsed = import_file(
+                    options["kind"],
+                    path,
+                    batch_size=options["batch_size"],
+                    on_conflict=options["on_conflict"],
+                    use_copy=not options["no_copy"],
+                )
+            except (OSError, ValueError) as error:
+                raise CommandError("{}: {}".format(path, error))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "{}: строк {}, создано {}, обновлено {}, пропущено {}, "
+                    "повторов в файле {} за {:.2f} с ({:.0f} строк/с)".format(
+                        path,
+                        result["rows"],
+                        result["created"],
+                        result["updated"],
+                        result["skipped"],
+                        result["duplicates"],
+                        elapsed,
+                        result["rows"] / elapsed if elapsed else 0,
+                    )
+                )
+            )
@@ -0,0 +1,28 @@
+"""Обработка уже загруженных картинок рецептов"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.images import process_recipe_image
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    """Перекодирует картинки и создаёт превью и заглушки для рецептов без них"""
+
+    help = "Создаёт превью для рецептов, у которых его ещё нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Обработать и рецепты с превью"
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if not options["all"]:
+            recipes = recipes.filter(Q(thumbnail="") | Q(placeholder=""))
+        recipe_ids = list(recipes.values_list("id", flat=True))
+        for recipe_id in recipe_ids:
+            process_recipe_image(recipe_id)
+        self.stdout.write(
+            self.style.SUCCESS("Обработано картинок: {}".format(len(recipe_ids)))
+        )
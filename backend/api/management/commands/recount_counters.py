@@ -0,0 +1,18 @@
+"""Пересчёт денормализованных счётчиков"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.counters import recount_counters
+from api.models import Cart, Favorite, Recipe
+
+
+class Command(BaseCommand):
+    """Команда пересчёта recipes_count, favorites_count и carts_count"""
+
+    help = "Пересчитывает счётчики рецептов, избранного и списков покупок"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_counters(get_user_model(), Recipe, Favorite, Cart)
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
@@ -0,0 +1,36 @@
+"""Периодическая обрезка лент подписок"""
+from django.core.management.base import BaseCommand
+
+from api.feed import trim_feeds
+from api.models import FeedEntry
+
+
+class Command(BaseCommand):
+    """
+    Оставляет в каждой ленте FEED_MAX_LENGTH новейших рецептов. Запускается
+    по расписанию, чтобы создание рецепта не удаляло записи у всех подписчиков.
+    """
+
+    help = "Удаляет из лент подписок записи сверх FEED_MAX_LENGTH"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = (
+            FeedEntry.objects.order_by("user_id")
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+        batch_size = options["batch_size"]
+        deleted = 0
+        last_user_id = 0
+        while True:
+            batch = list(user_ids.filter(user_id__gt=last_user_id)[:batch_size])
+            if not batch:
+                break
+            deleted += trim_feeds(batch)
+            last_user_id = batch[-1]
+        self.stdout.write(
+            self.style.SUCCESS("Удалено записей лент: {}".format(deleted))
+        )
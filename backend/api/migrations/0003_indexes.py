@@ -0,0 +1,60 @@
+# Generated by Django 3.2.13 on 2026-10-18 16:39
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def create_ingredient_trigram_index(apps, schema_editor):
+    """GIN-индекс по триграммам для ILIKE 'x%' без учёта регистра, только PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+        'ON api_ingredient USING gin (name gin_trgm_ops)'
+    )
+
+
+def drop_ingredient_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS ingredient_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ('-id',)},
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(unique=True, validators=[django.core.validators.RegexValidator(message='Недопустимые символы в слаге', regex='^[-a-zA-Z0-9_]+$')], verbose_name='Слаг тега'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_pattern_idx', opclasses=('varchar_pattern_ops',)),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_feed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique name ingredient'),
+        ),
+        migrations.RunPython(
+            create_ingredient_trigram_index, drop_ingredient_trigram_index
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.13 on 2026-10-18 16:46
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def fill_refcounts(apps, schema_editor):
+    Recipe = apps.get_model('api', 'Recipe')
+    StoredFile = apps.get_model('api', 'StoredFile')
+    refcounts = Counter()
+    for names in Recipe.objects.values_list('image', 'thumbnail').iterator():
+        refcounts.update(name for name in names if name)
+    StoredFile.objects.bulk_create(
+        StoredFile(name=name, refcount=refcount)
+        for name, refcount in refcounts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_recipe_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_refcounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка картинки (data URI)'),
+        ),
+    ]
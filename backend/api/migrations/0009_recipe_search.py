@@ -0,0 +1,76 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:20
+
+from django.db import migrations
+
+POSTGRES_SEARCH_SQL = (
+    "ALTER TABLE api_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS recipe_search_vector_idx "
+    "ON api_recipe USING gin (search_vector)",
+)
+POSTGRES_DROP_SQL = (
+    "DROP INDEX IF EXISTS recipe_search_vector_idx",
+    "ALTER TABLE api_recipe DROP COLUMN IF EXISTS search_vector",
+)
+SQLITE_SEARCH_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_recipe_fts USING fts5(name, text, "
+    "content='api_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS api_recipe_fts_insert "
+    "AFTER INSERT ON api_recipe BEGIN "
+    "INSERT INTO api_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS api_recipe_fts_delete "
+    "AFTER DELETE ON api_recipe BEGIN "
+    "INSERT INTO api_recipe_fts(api_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS api_recipe_fts_update "
+    "AFTER UPDATE OF name, text ON api_recipe BEGIN "
+    "INSERT INTO api_recipe_fts(api_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    "INSERT INTO api_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); "
+    "END",
+    "INSERT INTO api_recipe_fts(api_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_DROP_SQL = (
+    "DROP TRIGGER IF EXISTS api_recipe_fts_insert",
+    "DROP TRIGGER IF EXISTS api_recipe_fts_delete",
+    "DROP TRIGGER IF EXISTS api_recipe_fts_update",
+    "DROP TABLE IF EXISTS api_recipe_fts",
+)
+
+
+def run_for_vendor(postgres_sql, sqlite_sql):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            statements = postgres_sql
+        elif vendor == 'sqlite':
+            statements = sqlite_sql
+        else:
+            statements = ()
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    """tsvector с GIN-индексом на PostgreSQL, FTS5 с триггерами на SQLite"""
+
+    dependencies = [
+        ('api', '0008_recipe_placeholder'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_SEARCH_SQL, SQLITE_SEARCH_SQL),
+            run_for_vendor(POSTGRES_DROP_SQL, SQLITE_DROP_SQL),
+        ),
+    ]
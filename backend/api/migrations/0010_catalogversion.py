@@ -0,0 +1,28 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:14
+
+import time
+
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('api', 'CatalogVersion')
+    CatalogVersion.objects.create(id=1, version=int(time.time() * 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:19
+
+import uuid
+
+from django.db import migrations, models
+
+
+def fill_uuids(apps, schema_editor):
+    Recipe = apps.get_model('api', 'Recipe')
+    recipes = list(Recipe.objects.only('id'))
+    for recipe in recipes:
+        recipe.uuid = uuid.uuid4()
+    Recipe.objects.bulk_update(recipes, ['uuid'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    """Поле без unique, уникальные значения для старых строк, затем unique"""
+
+    dependencies = [
+        ('api', '0010_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Ключ для выгрузки и импорта'),
+        ),
+        migrations.RunPython(fill_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipe',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Ключ для выгрузки и импорта'),
+        ),
+    ]
@@ -1,11 +1,12 @@
-import base64
-import os
+import uuid
 
 from colorfield.fields import ColorField
 from django.conf import settings
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
+from .counters import CounterFieldsMixin
+
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=100)
@@ -19,6 +20,13 @@ class Ingredient(models.Model):
                 name="unique name ingredient",
             )
         ]
+        indexes = [
+            models.Index(
+                fields=("name",),
+                name="ingredient_name_pattern_idx",
+                opclasses=("varchar_pattern_ops",),
+            ),
+        ]
 
 
 class Tag(models.Model):
@@ -26,6 +34,7 @@ class Tag(models.Model):
     color = ColorField(default="#FF0000", unique=True)
     slug = models.SlugField(
         max_length=50,
+        unique=True,
         verbose_name="Слаг тега",
         validators=(
             RegexValidator(
@@ -36,13 +45,20 @@ class Tag(models.Model):
     )
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
+    counter_fields = ("favorites_count", "carts_count")
     author = models.ForeignKey(
         to=settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="recipe_author",
         verbose_name="Автор",
     )
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name="Ключ для выгрузки и импорта",
+    )
     name = models.CharField(max_length=200, verbose_name="Название")
     tags = models.ManyToManyField(
         to=Tag,
@@ -51,6 +67,12 @@ class Recipe(models.Model):
         verbose_name="теги",
     )
     image = models.ImageField(upload_to="media/recipes/images/")
+    thumbnail = models.ImageField(
+        upload_to="media/recipes/thumbnails/", blank=True, editable=False
+    )
+    placeholder = models.TextField(
+        blank=True, editable=False, verbose_name="Заглушка картинки (data URI)"
+    )
     text = models.TextField(verbose_name="Описание")
     ingredients = models.ManyToManyField(
         to=Ingredient,
@@ -73,24 +95,22 @@ class Recipe(models.Model):
     cooking_time = models.IntegerField(
         verbose_name="Время приготовления", validators=(MinValueValidator(1, "Min 1."),)
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В избранном"
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В списках покупок"
+    )
 
-    @staticmethod
-    def image_as_base64(image_file, format="png"):
-        """
-        :param `image_file` for the complete path of image.
-        :param `format` is format for image, eg: `png` or `jpg`.
-        """
-        if not os.path.isfile(image_file):
-            return None
-
-        encoded_string = ""
-        with open(image_file, "rb") as img_f:
-            encoded_string = base64.b64encode(img_f.read())
-        return "data:image/%s;base64,%s" % (format, encoded_string)
+    class Meta:
+        indexes = [
+            models.Index(fields=("author", "-id"), name="recipe_author_feed_idx"),
+        ]
 
     @property
-    def get_image_base64(self):
-        return self.image_as_base64(settings.MEDIA_ROOT + self.image.path)
+    def preview_image(self):
+        """Превью для карточек, пока его нет - исходная картинка"""
+        return self.thumbnail or self.image
 
 
 class Favorite(models.Model):
@@ -166,3 +186,36 @@ class Cart(models.Model):
                 name="unique cart user",
             )
         ]
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: рецепт автора, на которого подписан user"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="feed"
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+
+    class Meta:
+        ordering = ("-recipe",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="unique feed recipe",
+            )
+        ]
+
+
+class StoredFile(models.Model):
+    """Счётчик ссылок на файл в хранилище с адресацией по содержимому"""
+
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+
+class CatalogVersion(models.Model):
+    """Версия справочников тегов и ингредиентов: одна строка, общая для процессов"""
+
+    version = models.BigIntegerField(default=0)
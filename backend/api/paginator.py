@@ -1,7 +1,27 @@
-from rest_framework.pagination import PageNumberPagination, _positive_int
+from rest_framework.pagination import (
+    CursorPagination,
+    PageNumberPagination,
+    _positive_int,
+)
+
+
+class RecipeCursorPaginator(CursorPagination):
+    """Keyset-пагинация по -id: без OFFSET и без COUNT(*)"""
+
+    ordering = ("-id",)
+    page_size_query_param = "limit"
 
 
 class CustomPaginator(PageNumberPagination):
+    """
+    Постраничная пагинация по ?page=&limit=.
+    С параметром ?cursor= (можно пустым для первой страницы)
+    переключается на RecipeCursorPaginator с токенами next/previous.
+    """
+
+    cursor_query_param = "cursor"
+    cursor_paginator = None
+
     def get_page_size(self, request):
         page_size_query_param = request.query_params.get("limit")
         if page_size_query_param:
@@ -10,4 +30,17 @@ class CustomPaginator(PageNumberPagination):
                     page_size_query_param, strict=True, cutoff=self.max_page_size
                 )
             except (KeyError, ValueError):
-                return self.page_size
+                pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPaginator()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,142 @@
+"""Подбор рецептов по имеющимся ингредиентам через инвертированный индекс в памяти"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import RecipeIngredient
+
+# Позиции рецептов в postings: 4 байта на вхождение ингредиента в рецепт
+POSITION_TYPE = "I"
+RECIPE_ID_TYPE = "Q"
+SIZE_TYPE = "H"
+
+
+class IngredientRecipeIndex:
+    """
+    Для каждого ингредиента - массив позиций рецептов, в которых он есть.
+    Рядом отсортированный массив id рецептов и число ингредиентов в каждом.
+    Строится лениво, после сохранения и удаления рецептов обновляется
+    точечно в текущем процессе, целиком перестраивается раз
+    в RECIPE_MATCH_INDEX_TTL секунд, чтобы подхватить изменения
+    из других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+
+    @property
+    def is_built(self):
+        return self._index is not None
+
+    def invalidate(self):
+        self._index = None
+
+    def _is_stale(self):
+        return (
+            self._index is None
+            or time.monotonic() - self._built_at > settings.RECIPE_MATCH_INDEX_TTL
+        )
+
+    def _build(self):
+        with self._lock:
+            if not self._is_stale():
+                return self._index
+            recipe_ids = array(RECIPE_ID_TYPE)
+            sizes = array(SIZE_TYPE)
+            postings = defaultdict(lambda: array(POSITION_TYPE))
+            links = (
+                RecipeIngredient.objects.order_by("recipe_id")
+                .values_list("recipe_id", "ingredient_id")
+                .iterator(chunk_size=10000)
+            )
+            for recipe_id, ingredient_id in links:
+                if not recipe_ids or recipe_ids[-1] != recipe_id:
+                    recipe_ids.append(recipe_id)
+                    sizes.append(0)
+                sizes[-1] += 1
+                postings[ingredient_id].append(len(recipe_ids) - 1)
+            self._index = (dict(postings), recipe_ids, sizes)
+            self._built_at = time.monotonic()
+            return self._index
+
+    def update_recipe(self, recipe_id, old_ingredient_ids, new_ingredient_ids):
+        """Точечное обновление после коммита; postings заменяются копиями"""
+        with self._lock:
+            if self._index is None:
+                return
+            postings, recipe_ids, sizes = self._index
+            old_ingredient_ids = set(old_ingredient_ids)
+            new_ingredient_ids = set(new_ingredient_ids)
+            position = bisect_left(recipe_ids, recipe_id)
+            if position == len(recipe_ids) or recipe_ids[position] != recipe_id:
+                if position != len(recipe_ids):
+                    # Рецепт не в конце: дешевле перестроить индекс
+                    self._index = None
+                    return
+                if not new_ingredient_ids:
+                    return
+                recipe_ids.append(recipe_id)
+                sizes.append(0)
+            for ingredient_id in old_ingredient_ids - new_ingredient_ids:
+                postings[ingredient_id] = array(
+                    POSITION_TYPE,
+                    (
+                        item
+                        for item in postings.get(ingredient_id, ())
+                        if item != position
+                    ),
+                )
+            for ingredient_id in new_ingredient_ids - old_ingredient_ids:
+                positions = array(POSITION_TYPE, postings.get(ingredient_id, ()))
+                # Индекс мог быть построен уже после коммита этого изменения
+                if position not in positions:
+                    positions.append(position)
+                postings[ingredient_id] = positions
+            sizes[position] = len(new_ingredient_ids)
+
+    def match(self, ingredient_ids, limit):
+        """
+        Лучшие limit рецептов по доле имеющихся ингредиентов: список
+        (id рецепта, сколько ингредиентов есть, сколько всего нужно).
+        При равной доле выше рецепты с большим числом совпадений и новые.
+        """
+        index = self._index
+        if index is None or self._is_stale():
+            index = self._build()
+        postings, recipe_ids, sizes = index
+        counts = Counter()
+        for ingredient_id in set(ingredient_ids):
+            counts.update(postings.get(ingredient_id, ()))
+        best = heapq.nlargest(
+            limit,
+            (
+                (matched / sizes[position], matched, recipe_ids[position], position)
+                for position, matched in counts.items()
+                if sizes[position]
+            ),
+        )
+        return [
+            (recipe_id, matched, sizes[position])
+            for _, matched, recipe_id, position in best
+        ]
+
+
+def update_match_index(recipe_id, old_ingredient_ids, new_ingredient_ids):
+    old_ingredient_ids = list(old_ingredient_ids)
+    new_ingredient_ids = list(new_ingredient_ids)
+    transaction.on_commit(
+        lambda: recipe_match_index.update_recipe(
+            recipe_id, old_ingredient_ids, new_ingredient_ids
+        )
+    )
+
+
+recipe_match_index = IngredientRecipeIndex()
@@ -0,0 +1,147 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+PostgreSQL: генерируемая колонка search_vector (tsvector, russian) с GIN-индексом.
+SQLite: внешняя FTS5-таблица api_recipe_fts, которую держат в актуальном
+состоянии триггеры. Обе создаются миграцией 0009_recipe_search.
+"""
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = "russian"
+FTS_TABLE = "api_recipe_fts"
+# Вес совпадения в названии относительно описания
+NAME_WEIGHT = 10.0
+
+
+def get_fts_query(value):
+    """Слова запроса - фразы FTS5 с поиском по префиксу, операторы экранируются"""
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in value.split())
+
+
+def search_recipes(queryset, value):
+    """Оставляет рецепты, подходящие под запрос, и аннотирует search_rank"""
+    value = value.strip()
+    if not value:
+        return queryset
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        query = "websearch_to_tsquery('{}', %s)".format(SEARCH_CONFIG)
+        return queryset.annotate(
+            search_rank=RawSQL(
+                "ts_rank_cd({}.search_vector, {})".format(table, query),
+                (value,),
+                output_field=FloatField(),
+            )
+        ).filter(
+            id__in=RawSQL(
+                "SELECT id FROM {} WHERE search_vector @@ {}".format(table, query),
+                (value,),
+            )
+        )
+    if connection.vendor == "sqlite":
+        fts_query = get_fts_query(value)
+        return queryset.annotate(
+            search_rank=RawSQL(
+                "SELECT -bm25({fts}, %s, 1.0) FROM {fts} "
+                "WHERE {fts} MATCH %s AND rowid = {table}.id".format(
+                    fts=FTS_TABLE, table=table
+                ),
+                (NAME_WEIGHT, fts_query),
+                output_field=FloatField(),
+            )
+        ).filter(
+            id__in=RawSQL(
+                "SELECT rowid FROM {} WHERE {} MATCH %s".format(FTS_TABLE, FTS_TABLE),
+                (fts_query,),
+            )
+        )
+    # Остальные БД: без индекса и ранжирования
+    return queryset.annotate(
+        search_rank=RawSQL("0", (), output_field=FloatField())
+    ).filter(Q(name__icontains=value) | Q(text__icontains=value))
+
+
+POSTGRES_SEARCH_SQL = (
+    "ALTER TABLE api_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('{config}', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('{config}', coalesce(text, '')), 'B')"
+    ") STORED".format(config=SEARCH_CONFIG),
+    "CREATE INDEX IF NOT EXISTS recipe_search_vector_idx "
+    "ON api_recipe USING gin (search_vector)",
+)
+POSTGRES_DROP_SQL = (
+    "DROP INDEX IF EXISTS recipe_search_vector_idx",
+    "ALTER TABLE api_recipe DROP COLUMN IF EXISTS search_vector",
+)
+SQLITE_TRIGGERS = {
+    "api_recipe_fts_insert": (
+        "AFTER INSERT ON api_recipe BEGIN "
+        "INSERT INTO {fts}(rowid, name, text) VALUES (new.id, new.name, new.text); "
+        "END"
+    ),
+    "api_recipe_fts_delete": (
+        "AFTER DELETE ON api_recipe BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, name, text) "
+        "VALUES ('delete', old.id, old.name, old.text); "
+        "END"
+    ),
+    "api_recipe_fts_update": (
+        "AFTER UPDATE OF name, text ON api_recipe BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, name, text) "
+        "VALUES ('delete', old.id, old.name, old.text); "
+        "INSERT INTO {fts}(rowid, name, text) VALUES (new.id, new.name, new.text); "
+        "END"
+    ),
+}
+
+
+def create_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for sql in POSTGRES_SEARCH_SQL:
+            schema_editor.execute(sql)
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(name, text, "
+            "content='api_recipe', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')".format(fts=FTS_TABLE)
+        )
+        for name, body in SQLITE_TRIGGERS.items():
+            schema_editor.execute(
+                "CREATE TRIGGER IF NOT EXISTS {} {}".format(
+                    name, body.format(fts=FTS_TABLE)
+                )
+            )
+        schema_editor.execute(
+            "INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=FTS_TABLE)
+        )
+
+
+def repair_search_index(connection):
+    """
+    SQLite пересоздаёт таблицу рецептов при изменении её схемы и теряет
+    триггеры FTS5. Если индекс уже создан, а триггеров нет - создаёт их
+    заново и перестраивает индекс.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master")
+        objects = set(cursor.fetchall())
+    triggers = {("trigger", name) for name in SQLITE_TRIGGERS}
+    if ("table", FTS_TABLE) in objects and not triggers <= objects:
+        with connection.schema_editor() as schema_editor:
+            create_search_index(schema_editor)
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for sql in POSTGRES_DROP_SQL:
+            schema_editor.execute(sql)
+    elif vendor == "sqlite":
+        for name in SQLITE_TRIGGERS:
+            schema_editor.execute("DROP TRIGGER IF EXISTS {}".format(name))
+        schema_editor.execute("DROP TABLE IF EXISTS {}".format(FTS_TABLE))
@@ -1,11 +1,14 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.core.validators import MinValueValidator
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.relations import PrimaryKeyRelatedField
 from users.serializers import CustomUserSerializer
 
+from .counters import change_counter
+from .feed import fan_out_recipe
+from .images import RecipeImageField, schedule_image_processing
 from .models import (
     Recipe,
     Tag,
@@ -15,6 +18,7 @@ from .models import (
     TagRecipe,
     Favorite,
 )
+from .recipe_matcher import update_match_index
 
 user = get_user_model()
 
@@ -31,9 +35,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source="ingredient.id", queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source="ingredient.id")
     name = serializers.CharField(source="ingredient.name", read_only=True)
     measurement_unit = serializers.CharField(
         source="ingredient.measurement_unit", read_only=True
@@ -50,9 +52,11 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class AddSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(source="preview_image", read_only=True)
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "placeholder", "cooking_time")
         read_only_fields = fields
 
 
@@ -70,6 +74,9 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+TAG_IDS_FIELD = serializers.ListField(child=serializers.IntegerField())
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source="recipeingredient_set",
@@ -77,7 +84,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     tags = TagSerializer(read_only=True, many=True)
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField(validators=(MinValueValidator(1),))
@@ -89,6 +96,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients",
             "tags",
             "image",
+            "placeholder",
             "name",
             "text",
             "cooking_time",
@@ -113,62 +121,155 @@ class RecipeSerializer(serializers.ModelSerializer):
                 "amount_error"
             ] = "Убедитесь, что значение количества ингредиента больше 0"
 
+        existing_ingredients = Ingredient.objects.filter(id__in=ingredients_id).count()
+        if existing_ingredients != len(set(ingredients_id)):
+            errors["ingredients_id_error"] = "Такого ингредиента не существует"
+
+        try:
+            tags = set(
+                TAG_IDS_FIELD.run_validation(self.initial_data.get("tags") or [])
+            )
+        except serializers.ValidationError:
+            errors["tags_error"] = "id тегов должны быть целыми числами"
+        else:
+            if Tag.objects.filter(id__in=tags).count() != len(tags):
+                errors["tags_error"] = "Такого тега не существует"
+            if "tags" in self.initial_data:
+                data["tag_ids"] = tags
+
         if errors:
             raise serializers.ValidationError(errors)
         return data
 
-    def get_is_favorited(self, recipe):
-        request = self.context["request"]
-        author = request.user
+    def get_user_flag(self, recipe, flag, model):
+        """Берёт флаг из аннотации queryset, иначе проверяет запросом"""
+        if hasattr(recipe, flag):
+            return getattr(recipe, flag)
+        author = self.context["request"].user
         if isinstance(author, AnonymousUser):
             return False
-        return Favorite.objects.filter(user=author, recipe=recipe).exists()
+        return model.objects.filter(user=author, recipe=recipe).exists()
+
+    def get_is_favorited(self, recipe):
+        return self.get_user_flag(recipe, "is_favorited", Favorite)
 
     def get_is_in_shopping_cart(self, recipe):
-        request = self.context["request"]
-        author = request.user
-        if isinstance(author, AnonymousUser):
-            return False
-        return Cart.objects.filter(user=author, recipe=recipe).exists()
+        return self.get_user_flag(recipe, "is_in_shopping_cart", Cart)
 
     @staticmethod
     def add_records_to_linked_models(recipe_obj, ingredients, tags):
-        for tag in tags:
-            TagRecipe.objects.create(recipe=recipe_obj, tag=Tag.objects.get(id=tag))
-        for ingredient in ingredients:
-            ingredient_obg = ingredient.get("ingredient").get("id")
-            amount = ingredient.get("amount")
-            RecipeIngredient.objects.create(
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe_obj, tag_id=tag) for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe_obj,
-                ingredient=ingredient_obg,
-                amount=amount,
+                ingredient_id=ingredient["ingredient"]["id"],
+                amount=ingredient["amount"],
             )
+            for ingredient in ingredients
+        )
+        update_match_index(
+            recipe_obj.id,
+            (),
+            (ingredient["ingredient"]["id"] for ingredient in ingredients),
+        )
 
+    @staticmethod
+    def update_records_in_linked_models(recipe_obj, ingredients, tags):
+        """Применяет к тегам и ингредиентам рецепта только разницу"""
+        current_tags = set(
+            TagRecipe.objects.filter(recipe=recipe_obj).values_list("tag_id", flat=True)
+        )
+        if current_tags - tags:
+            TagRecipe.objects.filter(
+                recipe=recipe_obj, tag_id__in=current_tags - tags
+            ).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe_obj, tag_id=tag) for tag in tags - current_tags
+        )
+
+        amounts = {
+            ingredient["ingredient"]["id"]: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        current_ingredients = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(recipe=recipe_obj)
+        }
+        update_match_index(recipe_obj.id, current_ingredients, amounts)
+        removed = current_ingredients.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe_obj, ingredient_id__in=removed
+            ).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe_obj, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current_ingredients
+        )
+        changed = []
+        for ingredient_id, recipe_ingredient in current_ingredients.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ("amount",))
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context["request"]
         ingredients = validated_data.pop("recipeingredient_set")
-        tags = request.data["tags"]
+        tags = validated_data.pop("tag_ids", set())
         recipe_obj = Recipe.objects.create(author=request.user, **validated_data)
         self.add_records_to_linked_models(
             recipe_obj=recipe_obj, ingredients=ingredients, tags=tags
         )
+        change_counter(user.objects.filter(id=request.user.id), "recipes_count", 1)
+        fan_out_recipe(recipe_obj)
+        schedule_image_processing(recipe_obj.id)
 
         return recipe_obj
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        request = self.context["request"]
-        validated_data["author"] = request.user
         ingredients = validated_data.pop("recipeingredient_set")
-        tags = request.data["tags"]
-        recipe_obj = instance
-        RecipeIngredient.objects.filter(
-            recipe=recipe_obj,
-        ).delete()
-        TagRecipe.objects.filter(
-            recipe=recipe_obj,
-        ).delete()
-        self.add_records_to_linked_models(
+        tags = validated_data.pop("tag_ids", None)
+        if tags is None:
+            tags = set(instance.tags.values_list("id", flat=True))
+        recipe_obj = super().update(instance, validated_data)
+        if "image" in validated_data:
+            schedule_image_processing(recipe_obj.id)
+        self.update_records_in_linked_models(
             recipe_obj=recipe_obj, ingredients=ingredients, tags=tags
         )
 
         return recipe_obj
+
+
+class RecipeMatchSerializer(AddSerializer):
+    """Короткая карточка рецепта с долей имеющихся ингредиентов и недостающими"""
+
+    match_ratio = serializers.SerializerMethodField()
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(AddSerializer.Meta):
+        fields = AddSerializer.Meta.fields + ("match_ratio", "missing_ingredients")
+        read_only_fields = fields
+
+    def get_match_ratio(self, recipe):
+        matched, total = self.context["matches"][recipe.id]
+        return round(matched / total, 3)
+
+    def get_missing_ingredients(self, recipe):
+        available = self.context["available_ingredients"]
+        return RecipeIngredientSerializer(
+            (
+                recipe_ingredient
+                for recipe_ingredient in recipe.recipeingredient_set.all()
+                if recipe_ingredient.ingredient_id not in available
+            ),
+            many=True,
+        ).data
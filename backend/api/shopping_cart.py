@@ -0,0 +1,92 @@
+"""Выгрузка списка покупок в txt, csv и pdf"""
+import csv
+import io
+import os
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+from .models import RecipeIngredient
+
+CHUNK_SIZE = 2000
+PDF_FONT_NAME = "ShoppingCartFont"
+
+
+def get_shopping_cart_ingredients(user):
+    """
+    Один GROUP BY по ингредиенту с суммой количества по всем рецептам.
+    Строки (не больше одной на ингредиент) читаются сразу, в потоке
+    представления: под ASGI потоковый ответ перебирается в цикле событий,
+    где обращаться к БД нельзя.
+    """
+    return list(
+        RecipeIngredient.objects.filter(recipe__cart__user=user)
+        .values("ingredient")
+        .annotate(
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+            total_amount=Sum("amount"),
+        )
+        .order_by("name")
+        .values_list("name", "measurement_unit", "total_amount")
+    )
+
+
+def render_txt(ingredients):
+    for name, measurement_unit, amount in ingredients:
+        yield "{} ({}) - {}\n".format(name, measurement_unit, amount).encode()
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: отдаёт строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(("Ингредиент", "Единица измерения", "Количество")).encode()
+    for row in ingredients:
+        yield writer.writerow(row).encode()
+
+
+def render_pdf(ingredients):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font_name = "Helvetica"
+    if os.path.isfile(settings.SHOPPING_CART_PDF_FONT):
+        if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+            )
+        font_name = PDF_FONT_NAME
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top, bottom, line_height = height - 50, 50, 18
+    pdf.setFont(font_name, 16)
+    pdf.drawString(50, top, "Список покупок")
+    y = top - 2 * line_height
+    pdf.setFont(font_name, 12)
+    for name, measurement_unit, amount in ingredients:
+        if y < bottom:
+            pdf.showPage()
+            pdf.setFont(font_name, 12)
+            y = top
+        pdf.drawString(50, y, "• {} ({}) - {}".format(name, measurement_unit, amount))
+        y -= line_height
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(CHUNK_SIZE * 32), b"")
+
+
+RENDERERS = {
+    "txt": (render_txt, "text/plain; charset=utf-8"),
+    "csv": (render_csv, "text/csv; charset=utf-8"),
+    "pdf": (render_pdf, "application/pdf"),
+}
@@ -0,0 +1,87 @@
+from django.db import connections
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .caching import bump_catalog_version, invalidate_recipe_scopes
+from .ingredient_index import ingredient_index
+from .recipe_matcher import recipe_match_index, update_match_index
+from .models import Ingredient, Recipe, Tag
+from .search import repair_search_index
+
+RECIPE_FILE_FIELDS = ("image", "thumbnail")
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Ingredient)
+def invalidate_recipe_match_index(**kwargs):
+    recipe_match_index.invalidate()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_match_index(instance, **kwargs):
+    if not recipe_match_index.is_built:
+        return
+    update_match_index(
+        instance.id,
+        instance.recipeingredient_set.values_list("ingredient_id", flat=True),
+        (),
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def update_catalog_version(**kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def invalidate_recipe_cache(instance, **kwargs):
+    invalidate_recipe_scopes(
+        instance.id,
+        instance.author_id,
+        instance.tags.values_list("slug", flat=True),
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_files(instance, **kwargs):
+    instance._previous_files = (
+        Recipe.objects.filter(pk=instance.pk).values(*RECIPE_FILE_FIELDS).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_files(instance, **kwargs):
+    """Убирает ссылки на файлы, которые рецепт заменил новыми"""
+    previous_files = getattr(instance, "_previous_files", None) or {}
+    for field_name, old_name in previous_files.items():
+        field_file = getattr(instance, field_name)
+        if old_name and old_name != field_file.name:
+            field_file.storage.delete(old_name)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_files(instance, **kwargs):
+    for field_name in RECIPE_FILE_FIELDS:
+        field_file = getattr(instance, field_name)
+        if field_file:
+            field_file.storage.delete(field_file.name)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.label == "api":
+        repair_search_index(connections[using])
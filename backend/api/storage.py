@@ -0,0 +1,104 @@
+"""Хранилище медиафайлов с адресацией по содержимому и счётчиком ссылок"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from collections import Counter, defaultdict
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .counters import change_counter
+from .models import StoredFile
+
+
+def acquire_file(name):
+    """Увеличивает счётчик ссылок, создавая запись при первой ссылке"""
+    if StoredFile.objects.filter(name=name).update(refcount=F("refcount") + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refcount=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(refcount=F("refcount") + 1)
+
+
+def acquire_files(names):
+    """
+    Пакетный acquire_file для импорта: по запросу на каждое значение
+    прироста вместо запроса на каждый файл
+    """
+    refcounts = Counter(name for name in names if name)
+    existing = set(
+        StoredFile.objects.filter(name__in=refcounts).values_list("name", flat=True)
+    )
+    StoredFile.objects.bulk_create(
+        (
+            StoredFile(name=name, refcount=refcount)
+            for name, refcount in refcounts.items()
+            if name not in existing
+        ),
+        ignore_conflicts=True,
+    )
+    names_by_delta = defaultdict(list)
+    for name in existing:
+        names_by_delta[refcounts[name]].append(name)
+    for delta, delta_names in names_by_delta.items():
+        StoredFile.objects.filter(name__in=delta_names).update(
+            refcount=F("refcount") + delta
+        )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файлы называются по sha256 содержимого, поэтому одинаковые картинки
+    хранятся один раз, а по одному имени всегда отдаётся одно содержимое.
+    save() добавляет ссылку на файл, delete() - убирает её; сам файл
+    удаляется после коммита, когда ссылок не осталось.
+    """
+
+    def get_hashed_name(self, name, content):
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        directory, file_name = posixpath.split(name)
+        extension = posixpath.splitext(file_name)[1].lower()
+        return posixpath.join(directory, hasher.hexdigest() + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменяется хэшем в _save
+        return name
+
+    def write_file(self, name, content):
+        """Пишет во временный файл и атомарно переименовывает"""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp_file:
+            for chunk in content.chunks():
+                temp_file.write(chunk)
+        os.chmod(temp_file.name, self.file_permissions_mode or 0o644)
+        os.replace(temp_file.name, full_path)
+
+    def _save(self, name, content):
+        name = self.get_hashed_name(name, content)
+        # Ссылка берётся до проверки наличия файла: purge() удаляет файл
+        # под блокировкой той же записи
+        acquire_file(name)
+        if not self.exists(name):
+            self.write_file(name, content)
+        return name
+
+    def delete(self, name):
+        if not name:
+            return
+        change_counter(StoredFile.objects.filter(name=name), "refcount", -1)
+        transaction.on_commit(lambda: self.purge(name))
+
+    def purge(self, name):
+        """Удаляет файл, если на него больше никто не ссылается"""
+        with transaction.atomic():
+            deleted, _ = StoredFile.objects.filter(name=name, refcount=0).delete()
+            if deleted:
+                super().delete(name)
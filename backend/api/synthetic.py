@@ -0,0 +1,155 @@
+"""Синтетический набор данных для проверки планов запросов и бенчмарков"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from users.models import Subscribers
+
+from .models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    TagRecipe,
+)
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+PASSWORD = "synthetic-password"
+
+
+def seed_dataset(
+    prefix="synthetic",
+    users=50,
+    recipes=1000,
+    ingredients=300,
+    tags=10,
+    ingredients_per_recipe=8,
+    tags_per_recipe=2,
+    follows=10,
+    favorites=20,
+    carts=5,
+    random_seed=0,
+):
+    """
+    Заполняет БД пакетами через bulk_create и возвращает словарь
+    со списками id созданных объектов. Все имена начинаются с prefix.
+    """
+    rnd = random.Random(random_seed)
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create(
+        (
+            User(
+                username="{}-{}".format(prefix, number),
+                email="{}-{}@example.com".format(prefix, number),
+                first_name="Имя",
+                last_name="Фамилия",
+                password=password,
+            )
+            for number in range(users)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=prefix + "-").values_list(
+            "id", flat=True
+        )
+    )
+
+    Tag.objects.bulk_create(
+        Tag(
+            name="{} {}".format(prefix, number),
+            slug="{}-{}".format(prefix, number),
+            color="#{:06X}".format(rnd.randrange(0x1000000)),
+        )
+        for number in range(tags)
+    )
+    tag_ids = list(
+        Tag.objects.filter(slug__startswith=prefix + "-").values_list("id", flat=True)
+    )
+
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(name="{} {}".format(prefix, number), measurement_unit="г")
+            for number in range(ingredients)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    ingredient_ids = list(
+        Ingredient.objects.filter(name__startswith=prefix + " ").values_list(
+            "id", flat=True
+        )
+    )
+
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=rnd.choice(user_ids),
+                name="{} рецепт {}".format(prefix, number),
+                text="Описание рецепта {}".format(number),
+                image="recipes/images/{}.png".format(prefix),
+                cooking_time=rnd.randint(1, 120),
+            )
+            for number in range(recipes)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    recipe_ids = list(
+        Recipe.objects.filter(name__startswith=prefix + " ").values_list(
+            "id", flat=True
+        )
+    )
+
+    TagRecipe.objects.bulk_create(
+        (
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rnd.sample(tag_ids, min(tags_per_recipe, len(tag_ids)))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rnd.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in rnd.sample(
+                ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids))
+            )
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    for model, per_user in ((Favorite, favorites), (Cart, carts)):
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in rnd.sample(recipe_ids, min(per_user, len(recipe_ids)))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    Subscribers.objects.bulk_create(
+        (
+            Subscribers(user_id=user_id, subscribed_id=subscribed_id)
+            for user_id in user_ids
+            for subscribed_id in rnd.sample(user_ids, min(follows + 1, len(user_ids)))
+            if subscribed_id != user_id
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    return {
+        "users": user_ids,
+        "tags": tag_ids,
+        "ingredients": ingredient_ids,
+        "recipes": recipe_ids,
+    }
@@ -0,0 +1,381 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.models import Subscribers, User
+
+from .feed import backfill_feed, fan_out_recipe
+from .importer import import_file
+from .models import (
+    Cart,
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    TagRecipe,
+)
+
+
+def create_recipes(author, count, tags, ingredients):
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name="Рецепт {}".format(number),
+            text="Описание",
+            cooking_time=10,
+            image="recipes/images/recipe.png",
+        )
+        TagRecipe.objects.bulk_create(TagRecipe(tag=tag, recipe=recipe) for tag in tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+            for ingredient in ingredients
+        )
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.ru", password="password"
+        )
+        self.viewer = User.objects.create_user(
+            username="viewer", email="viewer@example.ru", password="password"
+        )
+        self.tags = [
+            Tag.objects.create(
+                name="Тег {}".format(number),
+                color="#00000{}".format(number),
+                slug="tag-{}".format(number),
+            )
+            for number in range(2)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(
+                name="Ингредиент {}".format(number), measurement_unit="г"
+            )
+            for number in range(3)
+        ]
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION="Token {}".format(
+                Token.objects.create(user=self.viewer).key
+            )
+        )
+
+    def get_list(self, client):
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        caches[settings.TOKEN_CACHE_ALIAS].clear()
+        response = client.get("/api/recipes/?limit=10")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assert_constant_queries(self, client):
+        create_recipes(self.author, 1, self.tags, self.ingredients)
+        with CaptureQueriesContext(connection) as one_recipe:
+            self.assertEqual(len(self.get_list(client).data["results"]), 1)
+        create_recipes(self.author, 9, self.tags, self.ingredients)
+        with self.assertNumQueries(len(one_recipe)):
+            self.assertEqual(len(self.get_list(client).data["results"]), 10)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient())
+
+    def test_authenticated(self):
+        self.assert_constant_queries(self.authenticated)
+
+
+class RecipeValidationTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.ru", password="password"
+        )
+        self.tag = Tag.objects.create(name="Тег", color="#000000", slug="tag")
+        self.ingredient = Ingredient.objects.create(
+            name="Ингредиент", measurement_unit="г"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        create_recipes(self.author, 1, [self.tag], [self.ingredient])
+        self.recipe = Recipe.objects.get()
+
+    def patch_tags(self, tags):
+        return self.client.patch(
+            "/api/recipes/{}/".format(self.recipe.id),
+            {
+                "name": "Рецепт",
+                "text": "Описание",
+                "cooking_time": 5,
+                "tags": tags,
+                "ingredients": [{"id": self.ingredient.id, "amount": 10}],
+            },
+            format="json",
+        )
+
+    def test_non_numeric_tag_id(self):
+        response = self.patch_tags(["abc"])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("tags_error", response.data)
+
+    def test_missing_tag(self):
+        response = self.patch_tags([self.tag.id + 100])
+        self.assertEqual(response.status_code, 400)
+
+    def test_numeric_string_tag_id(self):
+        response = self.patch_tags([str(self.tag.id)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([tag["id"] for tag in response.data["tags"]], [self.tag.id])
+
+
+class IngredientSearchTest(TestCase):
+    def setUp(self):
+        self.ingredient = Ingredient.objects.create(
+            name="Картофель", measurement_unit="г"
+        )
+        Ingredient.objects.create(name="Морковь", measurement_unit="г")
+
+    def test_list_by_prefix(self):
+        response = APIClient().get("/api/ingredients/", {"name": "карт"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.data], [self.ingredient.id])
+
+    def test_detail_ignores_name(self):
+        response = APIClient().get(
+            "/api/ingredients/{}/".format(self.ingredient.id), {"name": "мор"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], self.ingredient.id)
+
+
+class CatalogCacheTest(TestCase):
+    def test_etag_changes_after_catalog_write(self):
+        client = APIClient()
+        etag = client.get("/api/tags/")["ETag"]
+        self.assertEqual(
+            client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        Tag.objects.create(name="Новый", color="#111111", slug="new")
+        response = client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class AnonymousRecipeCacheTest(TestCase):
+    def setUp(self):
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.author = User.objects.create_user(
+            username="author", email="author@example.ru", password="password"
+        )
+
+    def test_evicted_generation_does_not_revive_stale_response(self):
+        client = APIClient()
+        create_recipes(self.author, 1, [], [])
+        self.assertEqual(client.get("/api/recipes/").data["count"], 1)
+        create_recipes(self.author, 1, [], [])
+        # Счётчик поколения вытеснен из кэша
+        caches[settings.RECIPE_CACHE_ALIAS].delete("recipe_scope:recipes")
+        self.assertEqual(client.get("/api/recipes/").data["count"], 2)
+
+
+@override_settings(FEED_MAX_LENGTH=2)
+class FeedTrimTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.ru", password="password"
+        )
+        self.follower = User.objects.create_user(
+            username="follower", email="follower@example.ru", password="password"
+        )
+        Subscribers.objects.create(user=self.follower, subscribed=self.author)
+
+    def test_trimmed_by_command_not_on_create(self):
+        create_recipes(self.author, 3, [], [])
+        for recipe in Recipe.objects.order_by("id"):
+            fan_out_recipe(recipe)
+        self.assertEqual(FeedEntry.objects.filter(user=self.follower).count(), 3)
+        call_command("trim_feeds", stdout=StringIO())
+        self.assertEqual(
+            list(
+                FeedEntry.objects.filter(user=self.follower)
+                .order_by("recipe_id")
+                .values_list("recipe_id", flat=True)
+            ),
+            list(Recipe.objects.order_by("id").values_list("id", flat=True)[1:]),
+        )
+
+    def test_backfill_keeps_newest(self):
+        create_recipes(self.author, 3, [], [])
+        FeedEntry.objects.bulk_create(
+            FeedEntry(user=self.follower, recipe=recipe)
+            for recipe in Recipe.objects.all()
+        )
+        backfill_feed(self.follower, self.author)
+        self.assertEqual(
+            set(
+                FeedEntry.objects.filter(user=self.follower).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            set(Recipe.objects.order_by("-id").values_list("id", flat=True)[:2]),
+        )
+
+
+class AsgiShoppingCartTest(TestCase):
+    """Под ASGI потоковый ответ читается в цикле событий, где ORM запрещён"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="user", email="user@example.ru", password="password"
+        )
+        self.token = Token.objects.create(user=self.user)
+        create_recipes(
+            self.user,
+            2,
+            [],
+            [Ingredient.objects.create(name="Соль", measurement_unit="г")],
+        )
+        Cart.objects.bulk_create(
+            Cart(user=self.user, recipe=recipe) for recipe in Recipe.objects.all()
+        )
+
+    async def test_download(self):
+        response = await AsyncClient().get(
+            "/api/recipes/download_shopping_cart/",
+            authorization="Token {}".format(self.token.key),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(), "Соль (г) - 200\n"
+        )
+
+
+class ExportImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="user", email="user@example.ru", password="password"
+        )
+        create_recipes(self.user, 1, [], [])
+        create_recipes(self.user, 1, [], [])
+        self.first, self.second = Recipe.objects.order_by("id")
+        Favorite.objects.create(user=self.user, recipe=self.second)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def export(self, *kinds):
+        call_command(
+            "export_data", *kinds, output_dir=self.directory.name, stdout=StringIO()
+        )
+
+    def read(self, kind):
+        with open(os.path.join(self.directory.name, kind + ".jsonl")) as file:
+            return [json.loads(line) for line in file]
+
+    def test_links_keep_recipe_with_same_name(self):
+        self.assertEqual(self.first.name, self.second.name)
+        self.export("recipes", "favorites")
+        self.assertEqual(
+            [row["uuid"] for row in self.read("recipes")],
+            [str(self.first.uuid), str(self.second.uuid)],
+        )
+        Favorite.objects.all().delete()
+        call_command(
+            "import_data",
+            "favorites",
+            os.path.join(self.directory.name, "favorites.jsonl"),
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            list(Favorite.objects.values_list("recipe_id", flat=True)),
+            [self.second.id],
+        )
+
+
+class RecipeImportTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(
+            username="user", email="user@example.ru", password="password"
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "recipes.jsonl")
+
+    def import_rows(self, rows):
+        with open(self.path, "w") as file:
+            for row in rows:
+                file.write(json.dumps(dict(row, author="user@example.ru")) + "\n")
+        return import_file("recipes", self.path)[0]
+
+    def recipe(self, **fields):
+        return dict({"name": "Суп", "text": "Описание", "cooking_time": 5}, **fields)
+
+    def test_same_name_with_uuid(self):
+        result = self.import_rows(
+            [
+                self.recipe(uuid="00000000-0000-0000-0000-000000000001"),
+                self.recipe(uuid="00000000-0000-0000-0000-000000000002"),
+            ]
+        )
+        self.assertEqual((result["created"], result["duplicates"]), (2, 0))
+        self.assertEqual(Recipe.objects.filter(name="Суп").count(), 2)
+
+    def test_same_name_without_uuid_reported(self):
+        result = self.import_rows([self.recipe(), self.recipe(cooking_time=7)])
+        self.assertEqual((result["created"], result["duplicates"]), (1, 1))
+        self.assertEqual(Recipe.objects.get().cooking_time, 7)
+
+
+class LinkImportTest(TestCase):
+    def setUp(self):
+        self.user, self.author, self.other = (
+            User.objects.create_user(
+                username=name, email=name + "@example.ru", password="password"
+            )
+            for name in ("user", "author", "other")
+        )
+        Subscribers.objects.create(user=self.user, subscribed=self.author)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "links.jsonl")
+
+    def import_rows(self, kind, rows):
+        with open(self.path, "w") as file:
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+        return import_file(kind, self.path)[0]
+
+    def test_subscriptions_count_only_inserted(self):
+        result = self.import_rows(
+            "subscriptions",
+            [
+                {"user": "user@example.ru", "author": "author@example.ru"},
+                {"user": "user@example.ru", "author": "other@example.ru"},
+            ],
+        )
+        self.assertEqual((result["created"], result["skipped"]), (1, 1))
+        self.assertEqual(Subscribers.objects.filter(user=self.user).count(), 2)
+
+    def test_favorite_by_uuid(self):
+        create_recipes(self.author, 1, [], [])
+        recipe = Recipe.objects.get()
+        result = self.import_rows(
+            "favorites", [{"user": "user@example.ru", "recipe": str(recipe.uuid)}]
+        )
+        self.assertEqual(result["created"], 1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_invalid_recipe_uuid(self):
+        with self.assertRaises(ValueError):
+            self.import_rows("favorites", [{"user": "user@example.ru", "recipe": "1"}])
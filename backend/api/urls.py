@@ -1,7 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
-from .views import RecipeViewSet, TagsViewSet, IngredientsViewSet
+from .views import (
+    DatabaseHealthView,
+    RecipeViewSet,
+    TagsViewSet,
+    IngredientsViewSet,
+)
 
 app_name = "api"
 
@@ -13,5 +18,6 @@ router.register("ingredients", IngredientsViewSet, basename="ingredients")
 
 
 urlpatterns = [
+    path("health/db/", DatabaseHealthView.as_view(), name="database_health"),
     path("", include(router.urls)),
 ]
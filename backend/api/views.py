@@ -1,36 +1,76 @@
-import io
+import os
 
 from django.conf import settings
-from django.db.models import Count
-from django.db.models import F
-from django.http import FileResponse
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import filters
-from rest_framework import viewsets, mixins, status
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import generics, viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.pagination import _positive_int
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from foodgram.postgresql.pool import get_pool_stats
 from users.permissions import IsAuthorOrReadOnly
 
-from .filters import IngredientSearchFilter
+from .caching import (
+    CatalogCacheMixin,
+    cached_anonymous_response,
+    get_list_scopes,
+    invalidate_recipe_scopes,
+)
+from .concurrency import AsyncReadViewSetMixin, prefetch_concurrently
+from .counters import change_counter
+from .filters import IngredientSearchFilter, RecipeFilter, RecipeOrderingFilter
 from .models import Recipe, Tag, Ingredient, Favorite, Cart, RecipeIngredient
 from .paginator import CustomPaginator
+from .recipe_matcher import recipe_match_index
+from .shopping_cart import RENDERERS, get_shopping_cart_ingredients
 from .serializers import (
     TagSerializer,
     RecipeSerializer,
     IngredientSerializer,
     AddSerializer,
+    RecipeMatchSerializer,
+)
+
+User = get_user_model()
+
+COUNTERS = {
+    Favorite: "favorites_count",
+    Cart: "carts_count",
+}
+RECIPE_PREFETCH = (
+    "tags",
+    Prefetch(
+        "recipeingredient_set",
+        queryset=RecipeIngredient.objects.select_related("ingredient"),
+    ),
 )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncReadViewSetMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     http_method_names = ("get", "post", "patch", "delete")
     pagination_class = CustomPaginator
-    filter_backends = (filters.OrderingFilter,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+    filterset_class = RecipeFilter
     ordering = ("-id",)
+    async_read_actions = ("list", "retrieve")
 
     def get_permissions(self):
+        if self.action not in (
+            "list",
+            "retrieve",
+            "create",
+            "partial_update",
+            "destroy",
+        ):
+            return super().get_permissions()
+
         if self.request.method == "GET":
             self.permission_classes = (AllowAny,)
 
@@ -43,26 +83,76 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return [permission() for permission in self.permission_classes]
 
     def get_queryset(self):
-        queryset = Recipe.objects.all()
-        if self.request.user.is_anonymous:
-            is_favorited, is_in_shopping_cart = False, False
-        else:
-            is_favorited = self.request.query_params.get("is_favorited")
-            is_in_shopping_cart = self.request.query_params.get("is_in_shopping_cart")
-        tags = self.request.query_params.getlist("tags")
-        author = self.request.query_params.get("author")
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-        if is_favorited:
-            queryset = queryset.filter(users_favorites=self.request.user).distinct()
-
-        if is_in_shopping_cart:
-            queryset = queryset.filter(users_shopping_cart=self.request.user).distinct()
-        if author:
-            queryset = queryset.filter(author__id=author).all()
-        return queryset
+        return self.annotate_user_flags(
+            Recipe.objects.select_related("author").prefetch_related(*RECIPE_PREFETCH),
+            self.request.user,
+        )
+
+    def paginate_queryset(self, queryset):
+        """Страница одним запросом, теги и ингредиенты к ней - параллельно"""
+        page = super().paginate_queryset(queryset.prefetch_related(None))
+        if page is not None:
+            prefetch_concurrently(page, RECIPE_PREFETCH)
+        return page
+
+    def get_object(self):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        recipe = generics.get_object_or_404(queryset, pk=self.kwargs["pk"])
+        self.check_object_permissions(self.request, recipe)
+        prefetch_concurrently([recipe], RECIPE_PREFETCH)
+        return recipe
+
+    def list(self, request, *args, **kwargs):
+        return cached_anonymous_response(
+            request,
+            get_list_scopes(request),
+            lambda: super(RecipeViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_anonymous_response(
+            request,
+            ["recipe:{}".format(kwargs["pk"])],
+            lambda: super(RecipeViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
+    def perform_create(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+        self.invalidate_cache(serializer.instance)
+
+    def perform_update(self, serializer):
+        old_tags = {tag.slug for tag in serializer.instance.tags.all()}
+        serializer.save()
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+        self.invalidate_cache(serializer.instance, old_tags)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User.objects.filter(id=instance.author_id), "recipes_count", -1)
+
+    @staticmethod
+    def invalidate_cache(recipe, old_tags=()):
+        tags = {tag.slug for tag in recipe.tags.all()}
+        invalidate_recipe_scopes(recipe.id, recipe.author_id, tags | set(old_tags))
+
+    @staticmethod
+    def annotate_user_flags(queryset, user: settings.AUTH_USER_MODEL):
+        """Считает is_favorited/is_in_shopping_cart в том же запросе, что и страница"""
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+        )
 
     @staticmethod
+    @transaction.atomic
     def add_object(model, user: settings.AUTH_USER_MODEL, pk: int):
         if model.objects.filter(user=user, recipe__id=pk).exists():
             return Response(
@@ -71,14 +161,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         recipe = get_object_or_404(Recipe, id=pk)
         model.objects.create(user=user, recipe=recipe)
+        change_counter(Recipe.objects.filter(id=pk), COUNTERS[model], 1)
         serializer = AddSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete_object(model, user: settings.AUTH_USER_MODEL, pk: int) -> Response:
-        object = model.objects.filter(user=user, recipe__id=pk)
-        if object.exists():
-            object.delete()
+        deleted, _ = model.objects.filter(user=user, recipe__id=pk).delete()
+        if deleted:
+            change_counter(Recipe.objects.filter(id=pk), COUNTERS[model], -deleted)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({"errors": "Ошибка "}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -108,45 +200,147 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.delete_object(model=Cart, user=request.user, pk=pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=("get",),
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь"""
+        queryset = self.filter_queryset(
+            self.get_queryset().filter(feed_entries__user=request.user)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=False,
         methods=("get",),
         permission_classes=[IsAuthenticated],
     )
     def download_shopping_cart(self, request):
-        carts = Cart.objects.filter(user=request.user).values_list("recipe")
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe__in=carts)
-            .values("ingredient__name")
-            .annotate(measurement_unit=F("ingredient__measurement_unit"))
-            .annotate(amount=F("amount"))
-            .annotate(count=Count("ingredient"))
+        file_format = request.query_params.get("file_format", "txt")
+        if file_format not in RENDERERS:
+            return Response(
+                {"errors": "Доступные форматы: {}".format(", ".join(RENDERERS))},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        render, content_type = RENDERERS[file_format]
+        response = StreamingHttpResponse(
+            render(get_shopping_cart_ingredients(request.user)),
+            content_type=content_type,
         )
-        file = io.BytesIO()
-        for ingredient in ingredients:
-            info = list(ingredient.values())
-            file.write(
-                str.encode("{} ({}) - {}\n".format(info[0], info[1], info[2] * info[3]))
+        response[
+            "Content-Disposition"
+        ] = 'attachment; filename="shopping_cart.{}"'.format(file_format)
+        return response
+
+    @staticmethod
+    def get_available_ingredients(request):
+        """id из ?ingredients=1&ingredients=2 или ?ingredients=1,2"""
+        return {
+            int(ingredient_id)
+            for value in request.query_params.getlist("ingredients")
+            for ingredient_id in value.split(",")
+            if ingredient_id.strip()
+        }
+
+    @action(
+        detail=False,
+        methods=("get",),
+        permission_classes=[AllowAny],
+    )
+    def match(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов"""
+        try:
+            available = self.get_available_ingredients(request)
+            limit = _positive_int(
+                request.query_params.get("limit", 10),
+                strict=True,
+                cutoff=settings.RECIPE_MATCH_MAX_LIMIT,
+            )
+        except ValueError:
+            return Response(
+                {"errors": "ingredients - список id ингредиентов, limit - число"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not available:
+            return Response(
+                {"errors": "Укажите хотя бы один ингредиент"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        file.seek(0)
-        return FileResponse(file, filename="shopping cart.txt")
+        matches = {
+            recipe_id: (matched, total)
+            for recipe_id, matched, total in recipe_match_index.match(available, limit)
+        }
+        recipes = Recipe.objects.filter(id__in=matches).prefetch_related(
+            Prefetch(
+                "recipeingredient_set",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            )
+        )
+        order = {recipe_id: position for position, recipe_id in enumerate(matches)}
+        recipes = sorted(recipes, key=lambda recipe: order[recipe.id])
+        serializer = RecipeMatchSerializer(
+            recipes,
+            many=True,
+            context={
+                "request": request,
+                "matches": matches,
+                "available_ingredients": available,
+            },
+        )
+        return Response(serializer.data)
 
 
 class TagsViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    AsyncReadViewSetMixin,
+    CatalogCacheMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     permission_classes = (AllowAny,)
     pagination_class = None
     serializer_class = TagSerializer
+    async_read_actions = ("list", "retrieve")
     queryset = Tag.objects.all()
 
 
 class IngredientsViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    AsyncReadViewSetMixin,
+    CatalogCacheMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     permission_classes = (AllowAny,)
     pagination_class = None
     serializer_class = IngredientSerializer
+    async_read_actions = ("list", "retrieve")
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ("^name",)
     queryset = Ingredient.objects.all()
+
+
+class DatabaseHealthView(APIView):
+    """Проверка соединения с БД; администратору - ещё и статистика пула процесса"""
+
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        try:
+            connection.ensure_connection()
+            usable = connection.is_usable()
+        except DatabaseError:
+            usable = False
+        data = {"status": "ok" if usable else "unavailable"}
+        if request.user.is_staff:
+            data.update(
+                pid=os.getpid(),
+                conn_max_age=connection.settings_dict["CONN_MAX_AGE"],
+                pool=get_pool_stats().get(connection.alias),
+            )
+        if not usable:
+            return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(data)
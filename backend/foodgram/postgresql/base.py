@@ -0,0 +1,90 @@
+"""
+PostgreSQL-бэкенд: проверка постоянных соединений (CONN_HEALTH_CHECKS,
+как в Django 4.1) и необязательный пул соединений процесса (POOL).
+"""
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extensions
+
+from .pool import PoolTimeout, get_pool
+
+Database = base.Database
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Database.Error:
+        return False
+    return True
+
+
+def reset_connection(connection):
+    """Откатывает незавершённую транзакцию; False - соединение не вернуть в пул"""
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_IDLE:
+        return True
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    try:
+        connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    def get_pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        return get_pool(self.alias, options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            return pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                is_usable,
+            )
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        if self.in_atomic_block:
+            # Соединение ещё числится за транзакцией, в пул его не вернуть
+            pool.discard(self.connection)
+        else:
+            pool.release(self.connection, reset_connection)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    @async_unsafe
+    def ensure_connection(self):
+        """Раз за запрос проверяет переиспользуемое соединение перед работой"""
+        if (
+            self.connection is not None
+            and self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
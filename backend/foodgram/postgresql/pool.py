@@ -0,0 +1,174 @@
+"""Пул соединений с БД внутри процесса: общий для всех потоков, со статистикой"""
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Не больше size открытых соединений на процесс. Свободные выдаются
+    в порядке LIFO; простоявшее дольше check_after секунд перед выдачей
+    проверяется, а прожившее дольше max_lifetime - пересоздаётся.
+    Если свободных нет, поток ждёт до timeout секунд.
+    """
+
+    def __init__(self, size, timeout, max_lifetime, check_after):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._condition = threading.Condition()
+        # (соединение, когда открыто, когда возвращено)
+        self._idle = []
+        self._opened_at = {}
+        self._opened = 0
+        self._active = 0
+        self._waiting = 0
+        self._counters = {
+            "checkouts": 0,
+            "connects": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+        }
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _take(self):
+        started = time.monotonic()
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._idle and self._opened >= self.size:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            "Нет свободного соединения с БД за {} с".format(
+                                self.timeout
+                            )
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - started
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._counters["checkouts"] += 1
+            self._active += 1
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+            return None, None, None
+
+    def acquire(self, connect, is_usable):
+        """Свободное соединение из пула или новое через connect()"""
+        connection, opened_at, released_at = self._take()
+        try:
+            now = time.monotonic()
+            if connection is not None and now - opened_at > self.max_lifetime:
+                self._close_quietly(connection)
+                connection = None
+            elif (
+                connection is not None
+                and now - released_at > self.check_after
+                and not is_usable(connection)
+            ):
+                with self._condition:
+                    self._counters["health_check_failures"] += 1
+                self._close_quietly(connection)
+                connection = None
+            if connection is None:
+                connection = connect()
+                opened_at = time.monotonic()
+                with self._condition:
+                    self._counters["connects"] += 1
+        except BaseException:
+            with self._condition:
+                self._opened -= 1
+                self._active -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._opened_at[id(connection)] = opened_at
+        return connection
+
+    def release(self, connection, reset):
+        """Возвращает соединение; reset(connection) решает, годится ли оно"""
+        with self._condition:
+            opened_at = self._opened_at.pop(id(connection), 0)
+        keep = time.monotonic() - opened_at <= self.max_lifetime and reset(connection)
+        with self._condition:
+            self._active -= 1
+            if keep:
+                self._idle.append((connection, opened_at, time.monotonic()))
+            else:
+                self._opened -= 1
+            self._condition.notify()
+        if not keep:
+            self._close_quietly(connection)
+
+    def discard(self, connection):
+        with self._condition:
+            self._opened_at.pop(id(connection), None)
+            self._active -= 1
+            self._opened -= 1
+            self._condition.notify()
+        self._close_quietly(connection)
+
+    def _close_quietly(self, connection):
+        with self._condition:
+            self._counters["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def get_stats(self):
+        with self._condition:
+            checkouts = self._counters["checkouts"]
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "active": self._active,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                **self._counters,
+                "wait_avg_ms": self._wait_total / checkouts * 1000 if checkouts else 0,
+                "wait_max_ms": self._wait_max * 1000,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """Пул соединения alias для текущего процесса; после fork создаётся новый"""
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    size=options["SIZE"],
+                    timeout=options["TIMEOUT"],
+                    max_lifetime=options["MAX_LIFETIME"],
+                    check_after=options["CHECK_AFTER"],
+                )
+    return pool
+
+
+def get_pool_stats():
+    """Статистика пулов текущего процесса по алиасам БД"""
+    pid = os.getpid()
+    return {
+        alias: pool.get_stats()
+        for (alias, pool_pid), pool in list(_pools.items())
+        if pool_pid == pid
+    }
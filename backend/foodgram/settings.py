@@ -9,6 +9,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -77,18 +79,90 @@ WSGI_APPLICATION = "foodgram.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+DB_ENGINE = os.getenv("ENGINE", default="foodgram.postgresql")
+# Пул и проверку соединений умеет только этот бэкенд
+POOLED_DB_ENGINE = "foodgram.postgresql"
+# Пул соединений процесса; 0 - без пула
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", default=0))
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv(
+        "DB_CONN_HEALTH_CHECKS",
+        default="1" if DB_ENGINE == POOLED_DB_ENGINE else "0",
+    )
+    == "1"
+)
+if DB_ENGINE != POOLED_DB_ENGINE and (DB_POOL_SIZE or DB_CONN_HEALTH_CHECKS):
+    raise ImproperlyConfigured(
+        "DB_POOL_SIZE и DB_CONN_HEALTH_CHECKS работают только с ENGINE={}, "
+        "сейчас ENGINE={}".format(POOLED_DB_ENGINE, DB_ENGINE)
+    )
+DB_POOL = None
+if DB_POOL_SIZE:
+    DB_POOL = {
+        "SIZE": DB_POOL_SIZE,
+        "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", default=10)),
+        "MAX_LIFETIME": int(os.getenv("DB_POOL_MAX_LIFETIME", default=1800)),
+        "CHECK_AFTER": int(os.getenv("DB_POOL_CHECK_AFTER", default=30)),
+    }
+# Секунды жизни постоянного соединения; с пулом соединение
+# возвращается в него после каждого запроса
+DB_CONN_MAX_AGE = 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", default=60))
+
 DATABASES = {
     "default": {
-        "ENGINE": os.getenv("ENGINE", default="django.db.backends.postgresql"),
+        "ENGINE": DB_ENGINE,
         "NAME": os.getenv("DB_NAME", default="postgres"),
         "USER": os.getenv("POSTGRES_USER", default="postgres"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", default="postgres"),
         "HOST": os.getenv("DB_HOST", default="db"),
         "PORT": os.getenv("DB_PORT", default=5432),
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+        "POOL": DB_POOL,
     }
 }
 
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", default="foodgram"),
+    },
+    # Кэш ответов для анонимов: LocMemCache, FileBasedCache
+    # или django_redis.cache.RedisCache, если установлен django-redis
+    "recipes": {
+        "BACKEND": os.getenv(
+            "RECIPE_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("RECIPE_CACHE_LOCATION", default="foodgram-recipes"),
+    },
+    # Токен -> пользователь: локальный LRU с TTL или общий кэш
+    "tokens": {
+        "BACKEND": os.getenv(
+            "TOKEN_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("TOKEN_CACHE_LOCATION", default="foodgram-tokens"),
+        "TIMEOUT": int(os.getenv("TOKEN_CACHE_TIMEOUT", default=60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", default=10000)),
+        },
+    },
+}
+RECIPE_CACHE_ALIAS = "recipes"
+TOKEN_CACHE_ALIAS = "tokens"
+# LocMemCache у каждого воркера свой и не видит сбросов из других воркеров:
+# устаревший ответ живёт там до истечения TTL, поэтому TTL короткий
+RECIPE_CACHE_IS_LOCAL = CACHES[RECIPE_CACHE_ALIAS]["BACKEND"].endswith(".LocMemCache")
+RECIPE_CACHE_TIMEOUT = int(
+    os.getenv("RECIPE_CACHE_TIMEOUT", default=10 if RECIPE_CACHE_IS_LOCAL else 300)
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -131,14 +205,45 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 # MEDIA_URL = "/media/"
 # MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+DEFAULT_FILE_STORAGE = "api.storage.ContentAddressedStorage"
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", default=0))
+
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv("RECIPE_IMAGE_MAX_BYTES", default=5 * 1024**2))
+RECIPE_IMAGE_MAX_SIDE = int(os.getenv("RECIPE_IMAGE_MAX_SIDE", default=1600))
+RECIPE_THUMBNAIL_SIDE = int(os.getenv("RECIPE_THUMBNAIL_SIDE", default=400))
+RECIPE_PLACEHOLDER_SIDE = int(os.getenv("RECIPE_PLACEHOLDER_SIDE", default=16))
+RECIPE_IMAGE_QUALITY = int(os.getenv("RECIPE_IMAGE_QUALITY", default=85))
+# 0 - обрабатывать картинки синхронно после коммита
+IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", default=2))
+
+FEED_MAX_LENGTH = int(os.getenv("FEED_MAX_LENGTH", default=1000))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", default=50))
+INGREDIENT_INDEX_TTL = int(os.getenv("INGREDIENT_INDEX_TTL", default=300))
+RECIPE_MATCH_INDEX_TTL = int(os.getenv("RECIPE_MATCH_INDEX_TTL", default=300))
+RECIPE_MATCH_MAX_LIMIT = int(os.getenv("RECIPE_MATCH_MAX_LIMIT", default=100))
+
+# foodgram.asgi включает асинхронные читающие эндпоинты
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", default="0") == "1"
+# Потоки (и соединения с БД) на процесс для асинхронного чтения
+ASYNC_READ_THREADS = int(os.getenv("ASYNC_READ_THREADS", default=16))
+# Потоки для параллельных prefetch-запросов; 0 - последовательно
+DB_FANOUT_WORKERS = int(os.getenv("DB_FANOUT_WORKERS", default=0))
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    "SHOPPING_CART_PDF_FONT",
+    default="/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ],
     "PAGE_SIZE": 10,
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
@@ -0,0 +1,29 @@
+"""
+Настройки gunicorn, читаются из текущего каталога автоматически.
+SERVER_MODE=wsgi - синхронные воркеры с потоками, SERVER_MODE=asgi -
+uvicorn-воркеры: медленные клиенты и запросы не держат воркер целиком.
+"""
+import multiprocessing
+import os
+
+SERVER_MODE = os.getenv("SERVER_MODE", default="wsgi")
+
+bind = os.getenv("GUNICORN_BIND", default="0:8000")
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", default=5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", default=30))
+# Перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", default=10000))
+max_requests_jitter = max_requests // 10
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "foodgram.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # Один процесс на ядро: соединения держит цикл событий, а не процессы
+    workers = int(os.getenv("GUNICORN_WORKERS", default=multiprocessing.cpu_count()))
+else:
+    wsgi_app = "foodgram.wsgi:application"
+    worker_class = "gthread"
+    workers = int(
+        os.getenv("GUNICORN_WORKERS", default=multiprocessing.cpu_count() * 2 + 1)
+    )
+    threads = int(os.getenv("GUNICORN_THREADS", default=4))
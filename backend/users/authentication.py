@@ -0,0 +1,40 @@
+"""Аутентификация по токену с кэшем токен -> пользователь"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+def get_token_cache():
+    return caches[settings.TOKEN_CACHE_ALIAS]
+
+
+def get_token_cache_key(key):
+    """В ключ кэша попадает хэш токена, а не сам токен"""
+    return "auth_token:{}".format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    get_token_cache().delete_many([get_token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, которая ходит в БД только при промахе кэша.
+    Кэш сбрасывается при удалении токена (в том числе logout) и при save()
+    пользователя (деактивация, смена пароля или профиля); update() мимо
+    save() и локальный кэш других процессов отстают не дольше
+    TOKEN_CACHE_TIMEOUT. Счётчики из кэшированного пользователя не
+    записываются обратно: см. CounterFieldsMixin.
+    """
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cache_key = get_token_cache_key(key)
+        user = token_cache.get(cache_key)
+        if user is not None:
+            return user, self.get_model()(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(cache_key, user)
+        return user, token
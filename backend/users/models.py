@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from api.counters import CounterFieldsMixin
 
-class User(AbstractUser):
+
+class User(CounterFieldsMixin, AbstractUser):
+    counter_fields = ("recipes_count",)
     email = models.EmailField(
         "Email",
         max_length=200,
@@ -10,6 +13,9 @@ class User(AbstractUser):
     )
     first_name = models.CharField("Имя", max_length=150)
     last_name = models.CharField("Фамилия", max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        "Количество рецептов", default=0, editable=False
+    )
 
     @property
     def subscribed_users(self):
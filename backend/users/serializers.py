@@ -1,3 +1,7 @@
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
@@ -6,6 +10,55 @@ from .models import User, Subscribers
 from api.models import Recipe
 
 
+def get_recipes_by_author(author_ids, limit=None):
+    """
+    Рецепты авторов одним запросом, у каждого не больше limit новейших:
+    ROW_NUMBER() OVER (PARTITION BY author_id ORDER BY id DESC) <= limit
+    """
+    recipes_by_author = defaultdict(list)
+    if not author_ids:
+        # Пустой IN не компилируется в SQL: sql_with_params() бросит EmptyResultSet
+        return recipes_by_author
+    recipes = Recipe.objects.filter(author_id__in=author_ids).only(
+        "id", "author_id", "name", "image", "thumbnail", "placeholder", "cooking_time"
+    )
+    if limit:
+        sql, params = recipes.annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=F("author_id"),
+                order_by=F("id").desc(),
+            )
+        ).query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            "SELECT * FROM ({}) ranked WHERE recipe_rank <= %s "
+            "ORDER BY id DESC".format(sql),
+            params + (limit,),
+        )
+    else:
+        recipes = recipes.order_by("-id")
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+def get_subscribed_ids(request):
+    """id авторов, на которых подписан пользователь, один запрос на request"""
+    if request is None or request.user.is_anonymous:
+        return set()
+    subscribed_ids = getattr(request, "subscribed_ids", None)
+    if subscribed_ids is None:
+        subscribed_ids = set(
+            request.user.subscribed_users.values_list("subscribed_id", flat=True)
+        )
+        request.subscribed_ids = subscribed_ids
+    return subscribed_ids
+
+
+def reset_subscribed_ids(request):
+    request.subscribed_ids = None
+
+
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -21,12 +74,7 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, user):
-        request = self.context["request"]
-        author = request.user
-        return any(
-            user == subscribeds_user.subscribed
-            for subscribeds_user in author.subscribed_users
-        )
+        return user.id in get_subscribed_ids(self.context.get("request"))
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -42,9 +90,11 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(source="preview_image", read_only=True)
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "placeholder", "cooking_time")
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -71,16 +121,18 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, subscribes):
-        request = self.context["request"]
-        author = request.user
-        return any(
-            subscribes.subscribed == subscribeds_user.subscribed
-            for subscribeds_user in author.subscribed_users
+        return subscribes.subscribed_id in get_subscribed_ids(
+            self.context.get("request")
         )
 
     def get_recipes(self, subscribers):
-        recipes = Recipe.objects.filter(author=subscribers.subscribed)
+        recipes_by_author = self.context.get("recipes_by_author")
+        if recipes_by_author is None:
+            recipes_by_author = get_recipes_by_author(
+                (subscribers.subscribed_id,), self.context.get("recipes_limit")
+            )
+        recipes = recipes_by_author.get(subscribers.subscribed_id, ())
         return SubscribeRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.subscribed).count()
+        return obj.subscribed.recipes_count
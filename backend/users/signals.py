@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    """Деактивация, смена пароля или профиля; вход (last_login) не в счёт"""
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    invalidate_tokens(Token.objects.filter(user=instance).values_list("key", flat=True))
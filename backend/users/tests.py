@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import CachedTokenAuthentication
+from .models import User
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        caches[settings.TOKEN_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(
+            username="user", email="user@example.ru", password="password"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token {}".format(self.token.key))
+
+    def test_set_password_keeps_counters(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        User.objects.filter(id=self.user.id).update(
+            recipes_count=F("recipes_count") + 1
+        )
+        response = self.client.post(
+            "/api/users/set_password/",
+            {"current_password": "password", "new_password": "Nf8dk3Lq0pZ"},
+        )
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assertTrue(self.user.check_password("Nf8dk3Lq0pZ"))
+
+    def test_cache_hit_skips_queries(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+    def test_deactivated_user_rejected(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+
+
+class SubscriptionsTest(TestCase):
+    def test_empty_page_with_recipes_limit(self):
+        user = User.objects.create_user(
+            username="user", email="user@example.ru", password="password"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get("/api/users/subscriptions/?recipes_limit=3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [])
@@ -1,16 +1,33 @@
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.pagination import LimitOffsetPagination, _positive_int
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from djoser.views import UserViewSet
+from api.concurrency import AsyncReadViewSetMixin, run_concurrently
+from api.feed import backfill_feed, remove_author_from_feed
 from .models import Subscribers, User
-from .serializers import CustomUserSerializer, SubscribeSerializer
+from .serializers import (
+    CustomUserSerializer,
+    SubscribeSerializer,
+    get_recipes_by_author,
+    get_subscribed_ids,
+    reset_subscribed_ids,
+)
 from django.conf import settings
 
 
-class SubscribesViewSet(UserViewSet):
+class SubscribesViewSet(AsyncReadViewSetMixin, UserViewSet):
+    async_read_actions = ("subscriptions",)
+
+    @staticmethod
+    def get_recipes_limit(request):
+        try:
+            return _positive_int(request.query_params["recipes_limit"], strict=True)
+        except (KeyError, ValueError):
+            return None
+
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
         user = request.user
@@ -28,23 +45,34 @@ class SubscribesViewSet(UserViewSet):
             )
 
         subscribe = Subscribers.objects.create(user=user, subscribed=author)
-        serializer = SubscribeSerializer(subscribe, context={"request": request})
+        reset_subscribed_ids(request)
+        backfill_feed(user, author)
+        serializer = SubscribeSerializer(
+            subscribe,
+            context={
+                "request": request,
+                "recipes_limit": self.get_recipes_limit(request),
+            },
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        queryset = Subscribers.objects.filter(user=user)
+        queryset = Subscribers.objects.filter(user=user).select_related("subscribed")
         page = self.paginate_queryset(queryset)
+        subscriptions = list(queryset if page is None else page)
+        recipes_by_author, _ = run_concurrently(
+            lambda: get_recipes_by_author(
+                [subscribe.subscribed_id for subscribe in subscriptions],
+                self.get_recipes_limit(request),
+            ),
+            lambda: get_subscribed_ids(request),
+        )
+        context = {"request": request, "recipes_by_author": recipes_by_author}
+        serializer = SubscribeSerializer(subscriptions, many=True, context=context)
         if page is not None:
-            serializer = SubscribeSerializer(
-                page, many=True, context={"request": request}
-            )
             return self.get_paginated_response(serializer.data)
-
-        serializer = SubscribeSerializer(
-            queryset, many=True, context={"request": request}
-        )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @subscribe.mapping.delete
@@ -59,6 +87,8 @@ class SubscribesViewSet(UserViewSet):
         subscribe = Subscribers.objects.filter(user=user, subscribed=author)
         if subscribe.exists():
             subscribe.delete()
+            reset_subscribed_ids(request)
+            remove_author_from_feed(user, author)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(